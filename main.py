@@ -787,6 +787,9 @@ class MLTradingBot:
                 self.strategy_stats_tracker[strategy]['operations'] += 1
                 self.send_strategy_stats()
             
+            if strategy == 'liquidity':
+                self.liquidity_system.register_signal_executed(signal_data.get('session'))
+            
             self.signal_aggregator.total_signals_executed += 1
             
             mtf_text = signal_data.get('mtf_reason', '')
@@ -956,26 +959,9 @@ class MLTradingBot:
                     )
                     
                     model_name = self.ensemble.active_model
-                    if model_name in self.ensemble.models:
-                        perf = self.ensemble.models[model_name]["performance"]
-                        perf["trades"] += 1
-                        
-                        if correct:
-                            perf["accuracy"] = ((perf["accuracy"] * (perf["trades"] - 1)) + 100) / perf["trades"]
-                        else:
-                            perf["accuracy"] = (perf["accuracy"] * (perf["trades"] - 1)) / perf["trades"]
-                        
-                        perf["profit"] += profit
-                        
-                        if perf["trades"] >= 5:
-                            if perf["accuracy"] > 60:
-                                self.ensemble.models[model_name]["weight"] = 1.5
-                            elif perf["accuracy"] > 50:
-                                self.ensemble.models[model_name]["weight"] = 1.0
-                            else:
-                                self.ensemble.models[model_name]["weight"] = 0.5
+                    self.ensemble.update_model_performance(model_name, correct, profit)
                 
-                self.ensemble.rotation_config["global_operations_count"] += 1
+                self.ensemble.increment_global_counter()
                 
                 rotation_status = self.ensemble.get_rotation_status()
                 ops_until = rotation_status['operations_until_rotation']
@@ -1011,8 +997,6 @@ class MLTradingBot:
                             self.logger.success(f"   ✅ Modelos actualizados (Operación #{self.incremental_learning.learning_stats['incremental_trains']})")
                             self.send_ml_status()
                 
-                self.ensemble.save_models()
-                
                 self.closed_trades_history[deal.position_id] = trade_info.copy()
                 
                 if len(self.closed_trades_history) > 100:
@@ -9,7 +9,10 @@
 ╚══════════════════════════════════════════════════════════════════════════╝
 """
 
+import time
 import MetaTrader5 as mt5
+import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta
 
 try:
@@ -27,6 +30,30 @@ except ImportError:
     CS_COOLDOWN_AFTER_SIGNAL_MINUTES = 90
     CS_MIN_CANDLES_BETWEEN_SIGNALS = 4
 
+# Conversión precio → pips (XAUUSD: 1 pip = 0.01)
+PIP_MULT = 100.0
+
+
+def ema_endpoints(closes, window, lookback):
+    """
+    EMA (misma fórmula que ta.trend.ema_indicator, adjust=False) evaluada
+    solo en la posición -lookback y en la última vela
+    
+    Returns:
+        tuple: (ema_inicio, ema_final)
+    """
+    alpha = 2.0 / (window + 1)
+    decay = 1.0 - alpha
+    values = []
+    
+    for t in (len(closes) - lookback, len(closes) - 1):
+        # ema_t = decay^t * x_0 + sum(alpha * decay^(t-k) * x_k)
+        weights = decay ** np.arange(t, -1, -1, dtype=np.float64)
+        weights[1:] *= alpha
+        values.append(float(np.dot(weights, closes[:t + 1])))
+    
+    return values[0], values[1]
+
 
 class CandlestickPatternSystem:
     """
@@ -51,6 +78,7 @@ class CandlestickPatternSystem:
         self.cooldown_minutes = CS_COOLDOWN_AFTER_SIGNAL_MINUTES
         self.min_candles_between = CS_MIN_CANDLES_BETWEEN_SIGNALS
         self.last_signal_time = None
+        self.last_signal_mono = None  # time.monotonic() para medir el cooldown
         self.last_signal_candle_count = None
         
         # 🆕 MTF: Configuración de timeframes
@@ -60,9 +88,11 @@ class CandlestickPatternSystem:
             'H4': mt5.TIMEFRAME_H4     # Contexto
         }
         
-        # Cache MTF
+        # Cache MTF (se invalida al cierre de vela de cada TF, en hora del servidor)
         self.mtf_cache = {}
         self.last_mtf_update = {}
+        self.mtf_refresh_at = {}
+        self._tf_seconds = {'M30': 1800, 'H1': 3600, 'H4': 14400}
         
         # Estadísticas
         self.pattern_stats = {
@@ -74,11 +104,10 @@ class CandlestickPatternSystem:
     
     def is_in_cooldown(self, df):
         """Verifica cooldown"""
-        now = datetime.now()
         current_candle_count = len(df)
         
-        if self.last_signal_time is not None:
-            time_elapsed = (now - self.last_signal_time).total_seconds() / 60
+        if self.last_signal_mono is not None:
+            time_elapsed = (time.monotonic() - self.last_signal_mono) / 60
             
             if time_elapsed < self.cooldown_minutes:
                 time_remaining = self.cooldown_minutes - time_elapsed
@@ -96,17 +125,26 @@ class CandlestickPatternSystem:
     def register_signal_generated(self, df):
         """Registra señal y activa cooldown"""
         self.last_signal_time = datetime.now()
+        self.last_signal_mono = time.monotonic()
         self.last_signal_candle_count = len(df)
     
-    def get_mtf_data(self, timeframe_name, bars=50):
-        """Obtiene datos de un timeframe específico con cache"""
-        now = datetime.now()
+    def get_mtf_data(self, timeframe_name, bars=50, bar_time=None):
+        """
+        Obtiene datos de un timeframe específico con cache
+        
+        Args:
+            timeframe_name: 'M30', 'H1' o 'H4'
+            bars: Velas a descargar
+            bar_time: Hora (del servidor) de la vela en formación del ciclo de
+                      análisis; sin ella siempre se descarga
+        """
         cache_key = timeframe_name
         
-        # Verificar cache
-        if cache_key in self.mtf_cache:
-            last_update = self.last_mtf_update.get(cache_key)
-            if last_update and (now - last_update).total_seconds() < 60:
+        # Verificar cache: solo refrescar cuando cerró la última vela descargada.
+        # Se compara en hora del servidor (la de las velas), no con el reloj
+        # local: las velas H4 del broker no siguen la rejilla UTC
+        if cache_key in self.mtf_cache and bar_time is not None:
+            if bar_time < self.mtf_refresh_at[cache_key]:
                 return self.mtf_cache[cache_key]
         
         # Obtener datos frescos
@@ -116,13 +154,15 @@ class CandlestickPatternSystem:
         if rates is None or len(rates) == 0:
             return None
         
-        import pandas as pd
         df = pd.DataFrame(rates)
         df['time'] = pd.to_datetime(df['time'], unit='s')
         
         # Actualizar cache
         self.mtf_cache[cache_key] = df
-        self.last_mtf_update[cache_key] = now
+        self.last_mtf_update[cache_key] = datetime.now()
+        self.mtf_refresh_at[cache_key] = df['time'].iat[-1] + pd.Timedelta(
+            seconds=self._tf_seconds[timeframe_name]
+        )
         
         return df
     
@@ -150,7 +190,7 @@ class CandlestickPatternSystem:
             'upper_wick': upper_wick,
             'lower_wick': lower_wick,
             'is_bullish': is_bullish,
-            'body_pips': body / 0.01
+            'body_pips': body * PIP_MULT
         }
     
     def check_trend(self, df, lookback=5):
@@ -158,22 +198,22 @@ class CandlestickPatternSystem:
         if len(df) < lookback + 50:
             return 'neutral'
         
-        # Calcular EMAs si no existen
-        if 'ema_21' not in df.columns:
-            import ta
-            df['ema_21'] = ta.trend.ema_indicator(df['close'], window=21)
-            df['ema_50'] = ta.trend.ema_indicator(df['close'], window=50)
-        
-        recent = df.tail(lookback)
-        
-        ema_21_trend = recent['ema_21'].iloc[-1] > recent['ema_21'].iloc[0]
-        ema_50_trend = recent['ema_50'].iloc[-1] > recent['ema_50'].iloc[0]
+        if 'ema_21' in df.columns:
+            recent = df.tail(lookback)
+            ema_21_start, ema_21_end = recent['ema_21'].iloc[0], recent['ema_21'].iloc[-1]
+            ema_50_start, ema_50_end = recent['ema_50'].iloc[0], recent['ema_50'].iloc[-1]
+        else:
+            # Solo se necesitan dos valores de cada EMA, no la serie completa
+            closes = df['close'].to_numpy(dtype=np.float64)
+            ema_21_start, ema_21_end = ema_endpoints(closes, 21, lookback)
+            ema_50_start, ema_50_end = ema_endpoints(closes, 50, lookback)
         
-        last = df.iloc[-1]
+        ema_21_trend = ema_21_end > ema_21_start
+        ema_50_trend = ema_50_end > ema_50_start
         
-        if last['ema_21'] > last['ema_50'] and ema_21_trend and ema_50_trend:
+        if ema_21_end > ema_50_end and ema_21_trend and ema_50_trend:
             return 'uptrend'
-        elif last['ema_21'] < last['ema_50'] and not ema_21_trend and not ema_50_trend:
+        elif ema_21_end < ema_50_end and not ema_21_trend and not ema_50_trend:
             return 'downtrend'
         
         return 'sideways'
@@ -191,12 +231,13 @@ class CandlestickPatternSystem:
         
         return has_spike, volume_ratio
     
-    def analyze_mtf_context(self, pattern_type):
+    def analyze_mtf_context(self, pattern_type, bar_time=None):
         """
         🆕 Analiza contexto multi-timeframe
         
         Args:
             pattern_type: 'bullish' o 'bearish'
+            bar_time: Hora de la última vela M30 del ciclo (invalida la cache MTF)
         
         Returns:
             dict: Análisis MTF con confianza ajustada
@@ -206,12 +247,13 @@ class CandlestickPatternSystem:
             'H1': {'trend': None, 'valid': False},
             'H4': {'trend': None, 'valid': False},
             'alignment': False,
-            'confidence_boost': 0.0
+            'confidence_boost': 0.0,
+            'aligned_str': ''
         }
         
         # Obtener tendencias de cada TF
         for tf_name in ['M30', 'H1', 'H4']:
-            df_tf = self.get_mtf_data(tf_name, bars=100)
+            df_tf = self.get_mtf_data(tf_name, bars=100, bar_time=bar_time)
             
             if df_tf is None or len(df_tf) < 50:
                 continue
@@ -226,7 +268,9 @@ class CandlestickPatternSystem:
                 mtf_analysis[tf_name]['valid'] = trend in ['uptrend', 'sideways']
         
         # Calcular alineación
-        valid_count = sum(1 for tf in ['M30', 'H1', 'H4'] if mtf_analysis[tf]['valid'])
+        aligned_tfs = [tf for tf in ('M30', 'H1', 'H4') if mtf_analysis[tf]['valid']]
+        valid_count = len(aligned_tfs)
+        mtf_analysis['aligned_str'] = '+'.join(aligned_tfs)
         
         # Ajustar confianza según alineación
         if valid_count == 3:
@@ -278,7 +322,7 @@ class CandlestickPatternSystem:
         has_volume_spike, volume_ratio = self.check_volume_confirmation(df)
         
         # 🆕 ANÁLISIS MTF
-        mtf_analysis = self.analyze_mtf_context('bullish')
+        mtf_analysis = self.analyze_mtf_context('bullish', df['time'].iat[-1])
         
         # CALCULAR CONFIANZA
         confidence = 0.55  # Base
@@ -349,7 +393,7 @@ class CandlestickPatternSystem:
         has_volume_spike, volume_ratio = self.check_volume_confirmation(df)
         
         # 🆕 ANÁLISIS MTF
-        mtf_analysis = self.analyze_mtf_context('bearish')
+        mtf_analysis = self.analyze_mtf_context('bearish', df['time'].iat[-1])
         
         # CONFIANZA
         confidence = 0.55
@@ -407,9 +451,7 @@ class CandlestickPatternSystem:
             if details.get('has_volume_spike'):
                 reason += " + Vol"
             if details.get('mtf_aligned'):
-                mtf = details['mtf_analysis']
-                aligned_tfs = [tf for tf in ['M30', 'H1', 'H4'] if mtf[tf]['valid']]
-                reason += f" + MTF({'+'.join(aligned_tfs)})"
+                reason += f" + MTF({details['mtf_analysis']['aligned_str']})"
             
             return {
                 'signal': 1,
@@ -432,9 +474,7 @@ class CandlestickPatternSystem:
             if details.get('has_volume_spike'):
                 reason += " + Vol"
             if details.get('mtf_aligned'):
-                mtf = details['mtf_analysis']
-                aligned_tfs = [tf for tf in ['M30', 'H1', 'H4'] if mtf[tf]['valid']]
-                reason += f" + MTF({'+'.join(aligned_tfs)})"
+                reason += f" + MTF({details['mtf_analysis']['aligned_str']})"
             
             return {
                 'signal': -1,
@@ -458,15 +498,14 @@ class CandlestickPatternSystem:
     
     def get_cooldown_status(self):
         """Retorna estado del cooldown"""
-        if self.last_signal_time is None:
+        if self.last_signal_mono is None:
             return {
                 'in_cooldown': False,
                 'can_generate_signal': True,
                 'message': 'Sin señales previas - Puede operar'
             }
         
-        now = datetime.now()
-        time_elapsed = (now - self.last_signal_time).total_seconds() / 60
+        time_elapsed = (time.monotonic() - self.last_signal_mono) / 60
         
         if time_elapsed < self.cooldown_minutes:
             time_remaining = self.cooldown_minutes - time_elapsed
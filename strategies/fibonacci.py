@@ -8,11 +8,236 @@
 ╚══════════════════════════════════════════════════════════════════════════╝
 """
 
+import atexit
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
 import MetaTrader5 as mt5
-from datetime import datetime
+import numpy as np
 from config import FIBO_SWING_LOOKBACK, FIBO_MIN_SWING_PIPS
 
 
+class Swing(NamedTuple):
+    """Swing detectado: el retroceso se mide de swing_start a swing_end"""
+    trend: str
+    swing_start: float
+    swing_end: float
+    swing_range: float
+    high: float
+    low: float
+
+
+def window_extremes(highs, lows, times):
+    """
+    Máximo y mínimo de la ventana completa (escaneo total)
+    
+    Returns:
+        tuple: (high, high_time, low, low_time)
+    """
+    high_idx = int(highs.argmax())
+    low_idx = int(lows.argmin())
+    return float(highs[high_idx]), times[high_idx], float(lows[low_idx]), times[low_idx]
+
+
+def swing_kernel(swing_high, high_time, swing_low, low_time, min_swing_pips, inv_pip):
+    """
+    Núcleo numérico del swing a partir de los extremos de la ventana
+    
+    Returns:
+        Swing: o None si el rango es menor a min_swing_pips
+    """
+    swing_range_pips = abs(swing_high - swing_low) * inv_pip
+    
+    if swing_range_pips < min_swing_pips:
+        return None
+    
+    if high_time > low_time:
+        return Swing('uptrend', swing_low, swing_high, swing_range_pips, swing_high, swing_low)
+    
+    return Swing('downtrend', swing_high, swing_low, swing_range_pips, swing_high, swing_low)
+
+
+@lru_cache(maxsize=128)
+def fib_levels_cached(swing_start, swing_end, ratios):
+    """
+    Niveles Fibonacci de un swing (función pura, memoizada)
+    
+    Args:
+        swing_start, swing_end: Precios redondeados a 5 decimales
+        ratios: tuple de ratios Fibonacci
+    
+    Returns:
+        tuple: Precio de cada nivel, en el orden de ratios
+    """
+    # Misma expresión para uptrend y downtrend: el retroceso parte de swing_end
+    swing_size = swing_end - swing_start
+    return tuple(swing_end - swing_size * ratio for ratio in ratios)
+
+
+def first_level_hit(levels, current_price, inv_pip, max_distance_pips):
+    """
+    Índice del primer nivel a menos de max_distance_pips del precio
+    
+    Returns:
+        int: Índice en levels, o -1 si ninguno está cerca
+    """
+    hits = np.flatnonzero(np.abs(levels - current_price) * inv_pip < max_distance_pips)
+    return int(hits[0]) if hits.size > 0 else -1
+
+
+def confluence_level_hit(level_rows, current_price, inv_pip, tolerance_pips, max_distance_pips):
+    """
+    Índice del primer nivel con confluencia entre TFs y precio cercano
+    
+    Args:
+        level_rows: Niveles por TF, forma (n_tfs, n_niveles), n_tfs >= 2
+    
+    Returns:
+        int: Índice del nivel, o -1 si no hay confluencia
+    """
+    # Precios cuantizados a pips enteros: todo el test es aritmética int32
+    n_tfs = len(level_rows)
+    levels_pips = np.rint(np.array(level_rows) * inv_pip).astype(np.int32)
+    price_pips = int(round(current_price * inv_pip))
+    
+    spread_pips = levels_pips.max(axis=0) - levels_pips.min(axis=0)
+    # |precio - media| < d  <=>  |n * precio - suma| < d * n (sin división)
+    distance_scaled = np.abs(price_pips * n_tfs - levels_pips.sum(axis=0))
+    
+    hits = np.flatnonzero((spread_pips <= tolerance_pips) &
+                          (distance_scaled < max_distance_pips * n_tfs))
+    return int(hits[0]) if hits.size > 0 else -1
+
+
+class ConfluenceResult:
+    """Resultado de check_mtf_confluence (slots: sin __dict__ por instancia)"""
+    
+    __slots__ = ('has_confluence', 'confluence_level', 'aligned_tfs',
+                 'trend_agreement', 'confidence_boost')
+    
+    def __init__(self):
+        self.has_confluence = False
+        self.confluence_level = None
+        self.aligned_tfs = []
+        self.trend_agreement = False
+        self.confidence_boost = 0.0
+    
+    def to_dict(self):
+        """Formato dict usado en la señal final"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SlidingExtremes:
+    """
+    Máximo/mínimo de ventana deslizante con colas monótonas
+    
+    Solo se insertan velas cerradas (identificadas por su tiempo); la vela
+    en formación se compara aparte en cada consulta. Cada vela entra y sale
+    de las colas una sola vez: O(1) amortizado por vela nueva.
+    """
+    
+    def __init__(self, lookback):
+        self.lookback = lookback
+        self._hi_deque = deque()  # (time, high) con highs decrecientes
+        self._lo_deque = deque()  # (time, low) con lows crecientes
+        self._last_bar_time = None
+    
+    def reset(self):
+        """Invalida el estado (arranque en frío)"""
+        self._hi_deque.clear()
+        self._lo_deque.clear()
+        self._last_bar_time = None
+    
+    def _rebuild(self, highs, lows, times, start, stop):
+        """
+        Construye las colas para las velas cerradas [start, stop)
+        
+        Una vela queda como candidata si ninguna posterior la supera, que es
+        exactamente lo que dejan los pops de la cola monótona. Se calcula con
+        máximos/mínimos acumulados desde el final en lugar de vela a vela.
+        """
+        window_highs = highs[start:stop]
+        window_lows = lows[start:stop]
+        
+        keep_hi = np.ones(len(window_highs), dtype=bool)
+        keep_lo = np.ones(len(window_lows), dtype=bool)
+        if len(window_highs) > 1:
+            later_max = np.maximum.accumulate(window_highs[::-1])[::-1]
+            later_min = np.minimum.accumulate(window_lows[::-1])[::-1]
+            keep_hi[:-1] = window_highs[:-1] >= later_max[1:]
+            keep_lo[:-1] = window_lows[:-1] <= later_min[1:]
+        
+        hi_idx = np.flatnonzero(keep_hi) + start
+        lo_idx = np.flatnonzero(keep_lo) + start
+        self._hi_deque = deque(zip(times[hi_idx], highs[hi_idx].tolist()))
+        self._lo_deque = deque(zip(times[lo_idx], lows[lo_idx].tolist()))
+    
+    def update(self, highs, lows, times):
+        """
+        Incorpora las velas cerradas nuevas y devuelve los extremos
+        
+        Args:
+            highs, lows, times: arrays de la ventana (última vela en formación)
+        
+        Returns:
+            tuple: (high, high_time, low, low_time)
+        """
+        n = len(times)
+        forming = n - 1
+        first = n - self.lookback
+        
+        # Posición de la primera vela cerrada sin procesar
+        start = first
+        if self._last_bar_time is not None:
+            pos = int(np.searchsorted(times, self._last_bar_time, side='right'))
+            if pos > 0 and times[pos - 1] == self._last_bar_time:
+                start = max(pos, first)
+            else:
+                # Datos no contiguos con el estado anterior
+                self.reset()
+        
+        if start == first:
+            # Arranque en frío: reconstruir ambas colas de una vez
+            self._rebuild(highs, lows, times, first, forming)
+        else:
+            for i in range(start, forming):
+                high, low, bar_time = float(highs[i]), float(lows[i]), times[i]
+                
+                # Descartar candidatos que ya no pueden ser extremos
+                while self._hi_deque and self._hi_deque[-1][1] < high:
+                    self._hi_deque.pop()
+                self._hi_deque.append((bar_time, high))
+                
+                while self._lo_deque and self._lo_deque[-1][1] > low:
+                    self._lo_deque.pop()
+                self._lo_deque.append((bar_time, low))
+        
+        if forming > 0:
+            self._last_bar_time = times[forming - 1]
+        
+        # Expirar velas fuera de la ventana
+        window_start = times[first]
+        while self._hi_deque and self._hi_deque[0][0] < window_start:
+            self._hi_deque.popleft()
+        while self._lo_deque and self._lo_deque[0][0] < window_start:
+            self._lo_deque.popleft()
+        
+        # Combinar con la vela en formación (gana solo si es estrictamente mayor/menor,
+        # igual que argmax/argmin con la primera ocurrencia)
+        high, high_time = float(highs[forming]), times[forming]
+        if self._hi_deque and self._hi_deque[0][1] >= high:
+            high_time, high = self._hi_deque[0]
+        
+        low, low_time = float(lows[forming]), times[forming]
+        if self._lo_deque and self._lo_deque[0][1] <= low:
+            low_time, low = self._lo_deque[0]
+        
+        return high, high_time, low, low_time
+
+
 class FibonacciRetracementSystem:
     """Sistema de Trading Fibonacci con Multi-Timeframe"""
     
@@ -22,14 +247,12 @@ class FibonacciRetracementSystem:
         self.swing_lookback = swing_lookback
         self.min_swing_pips = min_swing_pips
         self.enabled = True
+        self._inv_pip = 1.0 / 0.01  # precio → pips (XAUUSD)
         
-        self.fib_levels = {
-            '0.236': 0.236,
-            '0.382': 0.382,
-            '0.500': 0.500,
-            '0.618': 0.618,
-            '0.786': 0.786
-        }
+        # Niveles Fibonacci como arrays paralelos (nombres / ratios)
+        self._fib_names = ('0.236', '0.382', '0.500', '0.618', '0.786')
+        self._fib_ratios = np.array([0.236, 0.382, 0.500, 0.618, 0.786], dtype=np.float64)
+        self._fib_ratios_key = tuple(self._fib_ratios.tolist())  # hashable para lru_cache
         
         # 🆕 MTF: Configuración de timeframes
         self.mtf_timeframes = {
@@ -38,24 +261,38 @@ class FibonacciRetracementSystem:
             'H4': mt5.TIMEFRAME_H4     # Contexto mayor
         }
         
+        # Extremos incrementales por fuente ('local', 'M30', 'H1', 'H4')
+        self._swing_trackers = {}
+        
         # Cache
         self.cached_swing = None
+        self._cached_fib_arr = None
+        self._signal_template = None
         self.last_calculation = None
         
         # 🆕 Cache MTF
         self.mtf_swings = {}
+        self._mtf_dirty = True  # swings MTF pendientes de recalcular
         self.mtf_cache = {}
         self.last_mtf_update = {}
+        self._mtf_lock = threading.Lock()
+        
+        # Buffers contiguos reutilizables por TF (cada TF lo descarga un solo worker)
+        self._mtf_buffers = {}
+        
+        # Descarga MTF en paralelo (una tarea por TF)
+        self._pool = ThreadPoolExecutor(max_workers=3)
+        atexit.register(self._pool.shutdown, wait=False)
     
     def get_mtf_data(self, timeframe_name, bars=100):
         """Obtiene datos de un timeframe específico con cache"""
-        now = datetime.now()
+        now = time.monotonic()
         cache_key = timeframe_name
         
         # Verificar cache (válido por 2 minutos)
-        if cache_key in self.mtf_cache:
+        with self._mtf_lock:
             last_update = self.last_mtf_update.get(cache_key)
-            if last_update and (now - last_update).total_seconds() < 120:
+            if cache_key in self.mtf_cache and last_update is not None and now - last_update < 120:
                 return self.mtf_cache[cache_key]
         
         # Obtener datos frescos
@@ -65,78 +302,78 @@ class FibonacciRetracementSystem:
         if rates is None or len(rates) == 0:
             return None
         
-        import pandas as pd
-        df = pd.DataFrame(rates)
-        df['time'] = pd.to_datetime(df['time'], unit='s')
+        # Solo se usan high/low/time: se copian a buffers preasignados del TF
+        # (time queda en segundos epoch, se compara igual que datetime)
+        n = len(rates)
+        buffers = self._mtf_buffers.get(cache_key)
+        if buffers is None or len(buffers['high']) < n:
+            buffers = self._mtf_buffers[cache_key] = {
+                'high': np.empty(n, dtype=np.float64),
+                'low': np.empty(n, dtype=np.float64),
+                'time': np.empty(n, dtype=np.int64)
+            }
+        
+        data = {}
+        for field in ('high', 'low', 'time'):
+            np.copyto(buffers[field][:n], rates[field])
+            data[field] = buffers[field][:n]
         
         # Actualizar cache
-        self.mtf_cache[cache_key] = df
-        self.last_mtf_update[cache_key] = now
+        with self._mtf_lock:
+            self.mtf_cache[cache_key] = data
+            self.last_mtf_update[cache_key] = now
         
-        return df
+        return data
     
-    def find_swing_points(self, df):
-        """Encuentra puntos swing para Fibonacci"""
-        if len(df) < self.swing_lookback:
-            return None
-        
-        recent = df.tail(self.swing_lookback).copy()
-        
-        # Buscar swing high
-        swing_high_idx = recent['high'].idxmax()
-        swing_high = recent.loc[swing_high_idx, 'high']
-        swing_high_time = recent.loc[swing_high_idx, 'time']
-        
-        # Buscar swing low
-        swing_low_idx = recent['low'].idxmin()
-        swing_low = recent.loc[swing_low_idx, 'low']
-        swing_low_time = recent.loc[swing_low_idx, 'time']
+    def find_swing_points(self, data, key=None):
+        """
+        Encuentra puntos swing para Fibonacci
         
-        # Calcular distancia
-        swing_range_pips = abs(swing_high - swing_low) / 0.01
+        Args:
+            data: DataFrame o dict de arrays con 'high', 'low' y 'time'
+            key: Fuente de los datos; si se indica, los extremos se
+                 mantienen de forma incremental entre llamadas
         
-        if swing_range_pips < self.min_swing_pips:
+        Returns:
+            Swing: o None si no hay swing válido
+        """
+        if len(data['high']) < self.swing_lookback:
             return None
         
-        # Determinar tendencia
-        if swing_high_time > swing_low_time:
-            trend = 'uptrend'
-            swing_start = swing_low
-            swing_end = swing_high
+        # Vistas NumPy de la ventana (sin copiar el DataFrame)
+        highs = np.asarray(data['high'])[-self.swing_lookback:]
+        lows = np.asarray(data['low'])[-self.swing_lookback:]
+        times = np.asarray(data['time'])[-self.swing_lookback:]
+        
+        if key is None:
+            extremes = window_extremes(highs, lows, times)
         else:
-            trend = 'downtrend'
-            swing_start = swing_high
-            swing_end = swing_low
-        
-        return {
-            'trend': trend,
-            'swing_start': float(swing_start),
-            'swing_end': float(swing_end),
-            'swing_range': float(swing_range_pips),
-            'high': float(swing_high),
-            'low': float(swing_low)
-        }
+            tracker = self._swing_trackers.get(key)
+            if tracker is None:
+                tracker = self._swing_trackers[key] = SlidingExtremes(self.swing_lookback)
+            extremes = tracker.update(highs, lows, times)
+        
+        return swing_kernel(*extremes, self.min_swing_pips, self._inv_pip)
+    
+    def calculate_fib_tuple(self, swing):
+        """Niveles de Fibonacci como tuple alineado con self._fib_names"""
+        # Redondear evita fallos de cache por swings prácticamente iguales
+        return fib_levels_cached(
+            round(swing.swing_start, 5),
+            round(swing.swing_end, 5),
+            self._fib_ratios_key
+        )
+    
+    def calculate_fib_array(self, swing):
+        """Niveles de Fibonacci como array alineado con self._fib_names"""
+        return np.array(self.calculate_fib_tuple(swing), dtype=np.float64)
     
     def calculate_fib_levels(self, swing):
         """Calcula niveles de Fibonacci"""
         if not swing:
             return {}
         
-        swing_start = swing['swing_start']
-        swing_end = swing['swing_end']
-        trend = swing['trend']
-        
-        levels = {}
-        
-        for name, ratio in self.fib_levels.items():
-            if trend == 'uptrend':
-                level_price = swing_end - (swing_end - swing_start) * ratio
-            else:
-                level_price = swing_end + (swing_start - swing_end) * ratio
-            
-            levels[name] = float(level_price)
-        
-        return levels
+        return dict(zip(self._fib_names, self.calculate_fib_tuple(swing)))
     
     def analyze_mtf_swings(self):
         """
@@ -147,14 +384,20 @@ class FibonacciRetracementSystem:
         """
         mtf_swings = {}
         
-        for tf_name in ['M30', 'H1', 'H4']:
-            df_tf = self.get_mtf_data(tf_name, bars=100)
+        # Las llamadas a MT5 son bloqueantes: lanzar los 3 TFs a la vez
+        futures = {
+            tf_name: self._pool.submit(self.get_mtf_data, tf_name, 100)
+            for tf_name in ('M30', 'H1', 'H4')
+        }
+        
+        for tf_name, future in futures.items():
+            data_tf = future.result()
             
-            if df_tf is None or len(df_tf) < self.swing_lookback:
+            if data_tf is None or len(data_tf['high']) < self.swing_lookback:
                 mtf_swings[tf_name] = None
                 continue
             
-            swing = self.find_swing_points(df_tf)
+            swing = self.find_swing_points(data_tf, key=tf_name)
             mtf_swings[tf_name] = swing
         
         return mtf_swings
@@ -168,75 +411,50 @@ class FibonacciRetracementSystem:
             mtf_swings: Diccionario de swings por TF
         
         Returns:
-            dict: Análisis de confluencia
+            ConfluenceResult: Análisis de confluencia
         """
-        confluence_analysis = {
-            'has_confluence': False,
-            'confluence_level': None,
-            'aligned_tfs': [],
-            'trend_agreement': False,
-            'confidence_boost': 0.0
-        }
+        confluence_analysis = ConfluenceResult()
         
-        # Calcular niveles para cada TF
-        all_levels = {}
+        # Calcular niveles para cada TF: matriz (n_tfs, 5)
+        level_rows = []
+        tf_names = []
         trends = []
         
         for tf_name, swing in mtf_swings.items():
             if swing is None:
                 continue
             
-            levels = self.calculate_fib_levels(swing)
-            all_levels[tf_name] = levels
-            trends.append(swing['trend'])
+            level_rows.append(self.calculate_fib_tuple(swing))
+            tf_names.append(tf_name)
+            trends.append(swing.trend)
         
-        if len(all_levels) == 0:
+        if len(level_rows) == 0:
             return confluence_analysis
         
         # Buscar confluencias (niveles cercanos en diferentes TFs)
         tolerance_pips = 20  # Tolerancia para considerar confluencia
         
-        for level_name in self.fib_levels.keys():
-            prices_at_level = []
-            tfs_at_level = []
+        if len(level_rows) >= 2:
+            level_idx = confluence_level_hit(level_rows, current_price, self._inv_pip,
+                                             tolerance_pips, 15)
             
-            for tf_name, levels in all_levels.items():
-                if level_name in levels:
-                    prices_at_level.append(levels[level_name])
-                    tfs_at_level.append(tf_name)
-            
-            if len(prices_at_level) < 2:
-                continue
-            
-            # Verificar si los precios están cercanos
-            price_range = max(prices_at_level) - min(prices_at_level)
-            price_range_pips = price_range / 0.01
-            
-            if price_range_pips <= tolerance_pips:
-                # Hay confluencia en este nivel
-                avg_price = sum(prices_at_level) / len(prices_at_level)
-                distance_to_current = abs(current_price - avg_price) / 0.01
+            if level_idx >= 0:
+                confluence_analysis.has_confluence = True
+                confluence_analysis.confluence_level = self._fib_names[level_idx]
+                confluence_analysis.aligned_tfs = tf_names
                 
-                # Verificar si el precio está cerca del nivel
-                if distance_to_current < 15:
-                    confluence_analysis['has_confluence'] = True
-                    confluence_analysis['confluence_level'] = level_name
-                    confluence_analysis['aligned_tfs'] = tfs_at_level
-                    
-                    # Boost según número de TFs alineados
-                    if len(tfs_at_level) == 3:
-                        confluence_analysis['confidence_boost'] = 0.10
-                    elif len(tfs_at_level) == 2:
-                        confluence_analysis['confidence_boost'] = 0.05
-                    
-                    break
+                # Boost según número de TFs alineados
+                if len(tf_names) == 3:
+                    confluence_analysis.confidence_boost = 0.10
+                elif len(tf_names) == 2:
+                    confluence_analysis.confidence_boost = 0.05
         
         # Verificar acuerdo de tendencias
         if len(trends) >= 2:
             unique_trends = set(trends)
             if len(unique_trends) == 1:
-                confluence_analysis['trend_agreement'] = True
-                confluence_analysis['confidence_boost'] += 0.05
+                confluence_analysis.trend_agreement = True
+                confluence_analysis.confidence_boost += 0.05
         
         return confluence_analysis
     
@@ -246,71 +464,74 @@ class FibonacciRetracementSystem:
             return None
         
         # Recalcular cada 5 minutos
-        now = datetime.now()
-        if (self.last_calculation is None or 
-            (now - self.last_calculation).total_seconds() > 300):
+        now = time.monotonic()
+        if self.last_calculation is None or now - self.last_calculation > 300:
             
             # Swing local (M30)
-            self.cached_swing = self.find_swing_points(df)
+            self.cached_swing = self.find_swing_points(df, key='local')
             self.last_calculation = now
             
-            # 🆕 Analizar swings MTF
-            self.mtf_swings = self.analyze_mtf_swings()
+            # Los niveles solo dependen del swing: calcular una vez por refresco
+            if self.cached_swing:
+                self._cached_fib_arr = self.calculate_fib_array(self.cached_swing)
+                
+                # Plantilla de señal: solo cambia la dirección según el swing
+                self._signal_template = {
+                    'signal': 1 if self.cached_swing.trend == 'uptrend' else -1,
+                    'confidence': None,
+                    'reason': None,
+                    'sl_pips': 40,
+                    'tp_pips': 100,
+                    'fib_level': None,
+                    'mtf_confluence': None
+                }
+            
+            # 🆕 Swings MTF: se recalculan solo si el precio llega a un nivel
+            self._mtf_dirty = True
         
         swing = self.cached_swing
         
         if not swing:
             return None
         
-        fib_levels = self.calculate_fib_levels(swing)
+        fib_arr = self._cached_fib_arr
         
-        if not fib_levels:
+        # Buscar nivel cercano (primer nivel a menos de 15 pips)
+        level_idx = first_level_hit(fib_arr, current_price, self._inv_pip, 15)
+        
+        if level_idx < 0:
             return None
         
+        # 🆕 Analizar swings MTF (una vez por ventana de 5 minutos)
+        if self._mtf_dirty:
+            self.mtf_swings = self.analyze_mtf_swings()
+            self._mtf_dirty = False
+        
         # 🆕 Verificar confluencia MTF
         mtf_confluence = self.check_mtf_confluence(current_price, self.mtf_swings)
         
-        # Buscar nivel cercano
-        for level_name, level_price in fib_levels.items():
-            distance_pips = abs(current_price - level_price) / 0.01
-            
-            if distance_pips < 15:
-                
-                base_confidence = 0.60 + (float(level_name) * 0.15)
-                
-                # 🆕 Aplicar boost MTF
-                if mtf_confluence['has_confluence']:
-                    base_confidence += mtf_confluence['confidence_boost']
-                
-                base_confidence = min(base_confidence, 0.85)
-                
-                # Construir razón
-                reason = f"Fibo: Retroceso {level_name} @ ${level_price:.2f}"
-                
-                if mtf_confluence['has_confluence']:
-                    aligned = '+'.join(mtf_confluence['aligned_tfs'])
-                    reason += f" + MTF({aligned})"
-                
-                if swing['trend'] == 'uptrend':
-                    return {
-                        'signal': 1,
-                        'confidence': base_confidence,
-                        'reason': reason,
-                        'sl_pips': 40,
-                        'tp_pips': 100,
-                        'fib_level': level_name,
-                        'mtf_confluence': mtf_confluence
-                    }
-                
-                elif swing['trend'] == 'downtrend':
-                    return {
-                        'signal': -1,
-                        'confidence': base_confidence,
-                        'reason': reason,
-                        'sl_pips': 40,
-                        'tp_pips': 100,
-                        'fib_level': level_name,
-                        'mtf_confluence': mtf_confluence
-                    }
-        
-        return None
\ No newline at end of file
+        level_name = self._fib_names[level_idx]
+        level_price = float(fib_arr[level_idx])
+        
+        base_confidence = 0.60 + (float(level_name) * 0.15)
+        
+        # 🆕 Aplicar boost MTF
+        if mtf_confluence.has_confluence:
+            base_confidence += mtf_confluence.confidence_boost
+        
+        base_confidence = min(base_confidence, 0.85)
+        
+        # Construir razón
+        reason = f"Fibo: Retroceso {level_name} @ ${level_price:.2f}"
+        
+        if mtf_confluence.has_confluence:
+            aligned = '+'.join(mtf_confluence.aligned_tfs)
+            reason += f" + MTF({aligned})"
+        
+        signal = self._signal_template.copy()
+        signal['confidence'] = base_confidence
+        signal['reason'] = reason
+        signal['fib_level'] = level_name
+        signal['mtf_confluence'] = mtf_confluence.to_dict()
+        
+        return signal
@@ -19,13 +19,308 @@
 ╚══════════════════════════════════════════════════════════════════════════╝
 """
 
+import time
 import MetaTrader5 as mt5
-from datetime import datetime, time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from datetime import datetime
 from config import (
     LIQ_LOOKBACK_BARS, LIQ_SWEEP_TOLERANCE_PIPS,
     LIQ_MIN_WICK_SIZE_PIPS, LIQ_MIN_DISTANCE_FROM_SWEEP_PIPS
 )
 
+# XAUUSD: 1 pip = 0.01 → pips = diferencia de precio * PIP_INV
+PIP_INV = 100.0
+
+
+# 🆕 Sesión y prioridad por hora UTC (precalculado al importar)
+#   00-08 Asia | 08-13 Londres | 13-17 Londres+NY | 17-22 NY | 22-24 fuera de horario
+_SESSION_BY_HOUR = tuple(
+    ('asian', 0.6) if hour < 8 else
+    ('london_only', 0.9) if hour < 13 else
+    ('london_ny_overlap', 1.0) if hour < 17 else
+    ('ny_only', 0.9) if hour < 22 else
+    ('off_hours', 0.5)
+    for hour in range(24)
+)
+
+def scan_order_block_candidates(opens, highs, lows, closes, min_impulse_pips):
+    """
+    Candidatos a Order Block de la ventana reciente con sus reacciones en
+    velas CERRADAS (la última vela, aún en formación, no se cuenta).
+    
+    Args:
+        opens, highs, lows, closes: Arrays float64 de la ventana reciente
+        min_impulse_pips: Impulso mínimo en pips tras la vela del OB
+    
+    Returns:
+        Tupla de arrays paralelos (is_bullish, formation_index, move_pips,
+        closed_reactions) ordenados por índice de formación
+    """
+    n = len(closes)
+    if n < 11:
+        empty = np.empty(0, dtype=np.int64)
+        return empty.astype(bool), empty, empty.astype(np.float64), empty
+    
+    idx = np.arange(5, n - 5)
+    up = closes > opens
+    down = closes < opens
+    
+    # Conteo de velas de impulso en las 3 velas siguientes (ventana deslizante
+    # que empieza en i+1)
+    up_count = sliding_window_view(up, 3).sum(axis=1)[idx + 1]
+    down_count = sliding_window_view(down, 3).sum(axis=1)[idx + 1]
+    
+    last_close = closes[idx + 3]
+    bull_move = (last_close - lows[idx]) * PIP_INV
+    bear_move = (highs[idx] - last_close) * PIP_INV
+    
+    # Velas bajistas → OB alcista; velas alcistas → OB bajista
+    is_bullish = down[idx]
+    move_pips = np.where(is_bullish, bull_move, bear_move)
+    impulse_ok = np.where(is_bullish, up_count, down_count) >= 2
+    candidate = (down[idx] | up[idx]) & impulse_ok & (move_pips > min_impulse_pips)
+    
+    idx = idx[candidate]
+    is_bullish = is_bullish[candidate]
+    move_pips = move_pips[candidate]
+    
+    # Reacciones (solo candidatos): velas cerradas desde i+4 cuyo low (OB alcista)
+    # o high (OB bajista) cae en la zona [low_i, high_i]
+    probe = np.where(is_bullish[:, None], lows[None, :-1], highs[None, :-1])
+    in_zone = (lows[idx, None] <= probe) & (probe <= highs[idx, None])
+    in_zone &= np.arange(n - 1)[None, :] >= (idx + 4)[:, None]
+    closed_reactions = np.count_nonzero(in_zone, axis=1)
+    
+    return is_bullish, idx, move_pips, closed_reactions
+
+
+def forming_bar_reactions(is_bullish, zone_lows, zone_highs, high, low):
+    """
+    Reacción (0/1) de la vela en formación sobre cada candidato. Todo
+    candidato está a 5+ velas del final, así que siempre puede reaccionar.
+    
+    Args:
+        is_bullish: Array bool de candidatos alcistas
+        zone_lows, zone_highs: Límites de la zona de cada candidato
+        high, low: High/low actuales de la vela en formación
+    
+    Returns:
+        Array int de reacciones a sumar a las de velas cerradas
+    """
+    probe = np.where(is_bullish, low, high)
+    return ((zone_lows <= probe) & (probe <= zone_highs)).astype(np.intp)
+
+
+def scan_order_blocks(opens, highs, lows, closes, min_impulse_pips, min_reactions):
+    """
+    Kernel vectorizado del escaneo de Order Blocks.
+    
+    Args:
+        opens, highs, lows, closes: Arrays float64 de la ventana reciente
+        min_impulse_pips: Impulso mínimo en pips tras la vela del OB
+        min_reactions: Reacciones mínimas dentro de la zona
+    
+    Returns:
+        Tupla de arrays paralelos (is_bullish, formation_index, move_pips,
+        reaction_count) ordenados por índice de formación
+    """
+    is_bullish, idx, move_pips, reaction_count = scan_order_block_candidates(
+        opens, highs, lows, closes, min_impulse_pips
+    )
+    reaction_count = reaction_count + forming_bar_reactions(
+        is_bullish, lows[idx], highs[idx], highs[-1], lows[-1]
+    )
+    
+    keep = reaction_count >= min_reactions
+    return is_bullish[keep], idx[keep], move_pips[keep], reaction_count[keep]
+
+
+def sweep_kernel(opens, highs, lows, closes, current_price, lookback,
+                 tolerance_pips, min_wick_pips, min_distance_pips):
+    """
+    Kernel escalar de detección de liquidity sweep sobre la última vela.
+    
+    Args:
+        opens, highs, lows, closes: Arrays float64 completos
+        current_price: Precio actual
+        lookback: Velas para el máximo/mínimo reciente
+        tolerance_pips: Tolerancia respecto al extremo reciente
+        min_wick_pips: Mecha mínima en pips
+        min_distance_pips: Distancia mínima del precio al nivel barrido
+    
+    Returns:
+        Tupla (direction, swept_level, wick_pips, distance_pips, base_confidence)
+        con direction 1 (alcista) / -1 (bajista), o None si no hay sweep
+    """
+    candle_open = opens[-1]
+    candle_close = closes[-1]
+    candle_high = highs[-1]
+    candle_low = lows[-1]
+    tolerance = tolerance_pips / PIP_INV
+    
+    # BULLISH SWEEP (🆕 mecha mínima 700 pips, distancia mínima 80 pips)
+    wick_pips = (min(candle_open, candle_close) - candle_low) * PIP_INV
+    distance_pips = (current_price - candle_low) * PIP_INV
+    
+    if (candle_low <= lows[-lookback:].min() + tolerance and
+            wick_pips >= min_wick_pips and distance_pips >= min_distance_pips):
+        direction, swept_level = 1, candle_low
+    else:
+        # BEARISH SWEEP
+        wick_pips = (candle_high - max(candle_open, candle_close)) * PIP_INV
+        distance_pips = (candle_high - current_price) * PIP_INV
+        
+        if not (candle_high >= highs[-lookback:].max() - tolerance and
+                wick_pips >= min_wick_pips and distance_pips >= min_distance_pips):
+            return None
+        
+        direction, swept_level = -1, candle_high
+    
+    base_confidence = min(0.68 + (wick_pips - 700) * 0.00008, 0.82)
+    return direction, swept_level, wick_pips, distance_pips, base_confidence
+
+
+class FVG:
+    """Fair Value Gap detectado (slots: sin __dict__ por instancia)"""
+    
+    __slots__ = ('type', 'gap_high', 'gap_low', 'gap_mid', 'gap_size_pips',
+                 'impulse_pips', 'formation_index', 'time', 'filled')
+    
+    def __init__(self, type, gap_high, gap_low, gap_size_pips, impulse_pips,
+                 formation_index, time, filled=False):
+        self.type = type
+        self.gap_high = gap_high
+        self.gap_low = gap_low
+        self.gap_mid = (gap_high + gap_low) / 2
+        self.gap_size_pips = gap_size_pips
+        self.impulse_pips = impulse_pips
+        self.formation_index = formation_index
+        self.time = time
+        self.filled = filled
+    
+    def to_dict(self):
+        """Formato dict (logs / depuración)"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class OrderBlock:
+    """Order Block detectado (slots: sin __dict__ por instancia)"""
+    
+    __slots__ = ('type', 'zone_high', 'zone_low', 'zone_mid', 'strength',
+                 'reaction_count', 'formation_index', 'time', 'age_bars')
+    
+    def __init__(self, type, zone_high, zone_low, strength, reaction_count,
+                 formation_index, time, age_bars):
+        self.type = type
+        self.zone_high = zone_high
+        self.zone_low = zone_low
+        self.zone_mid = (zone_high + zone_low) / 2
+        self.strength = strength
+        self.reaction_count = reaction_count
+        self.formation_index = formation_index
+        self.time = time
+        self.age_bars = age_bars
+    
+    def to_dict(self):
+        """Formato dict (logs / depuración)"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Tabla de zonas (SoA): un registro por FVG/OB activo, ordenada por 'low'
+ZONE_DTYPE = np.dtype([
+    ('low', 'f8'),
+    ('high', 'f8'),
+    ('size_pips', 'f8'),   # gap_size_pips (FVG) o strength (OB)
+    ('bullish', '?'),
+    ('confidence', 'f8'),  # confianza base precalculada por zona
+    ('pos', 'i8')          # índice de la zona en la lista original
+])
+
+
+def build_zone_index(zones, low_key, high_key, size_key):
+    """
+    Tabla estructurada de zonas ordenada por límite inferior para búsquedas
+    binarias y máscaras vectorizadas.
+    
+    Args:
+        zones: Lista de FVG u OrderBlock en orden de prioridad
+        low_key: Atributo del límite inferior ('gap_low' / 'zone_low')
+        high_key: Atributo del límite superior ('gap_high' / 'zone_high')
+        size_key: Atributo de tamaño ('gap_size_pips' / 'strength')
+    
+    Returns:
+        Array estructurado ZONE_DTYPE ordenado por 'low' (se omiten FVG rellenados)
+    """
+    active = [i for i, zone in enumerate(zones) if not getattr(zone, 'filled', False)]
+    table = np.empty(len(active), dtype=ZONE_DTYPE)
+    
+    table['low'] = [getattr(zones[i], low_key) for i in active]
+    table['high'] = [getattr(zones[i], high_key) for i in active]
+    table['size_pips'] = [getattr(zones[i], size_key) for i in active]
+    table['bullish'] = [zones[i].type.startswith('bullish') for i in active]
+    table['confidence'] = 0.0
+    table['pos'] = active
+    
+    return table[np.argsort(table['low'], kind='stable')]
+
+
+def fvg_confidence(gap_size_pips):
+    """
+    Confianza base de FVG (vectorizada): 0.65 + bonus por tamaño, tope 0.80.
+    
+    Args:
+        gap_size_pips: Array de tamaños de gap en pips
+    
+    Returns:
+        Array de confianzas
+    """
+    return np.minimum(0.65 + (gap_size_pips / 1000) * 0.08, 0.80)
+
+
+def order_block_confidence(strength, reaction_count, age_bars):
+    """
+    Confianza base de Order Blocks (vectorizada): 0.62 + bonus de fuerza,
+    reacciones y antigüedad, tope 0.82.
+    
+    Args:
+        strength: Array de impulsos en pips
+        reaction_count: Array de reacciones
+        age_bars: Array de antigüedad en velas
+    
+    Returns:
+        Array de confianzas
+    """
+    strength_bonus = np.minimum(strength * 0.00004, 0.08)        # /2000 * 0.08
+    reaction_bonus = np.minimum(reaction_count * 0.012, 0.06)    # /5 * 0.06
+    age_bonus = np.maximum(0.0, (20 - age_bars) * 0.002)         # /20 * 0.04
+    
+    return np.minimum(0.62 + strength_bonus + reaction_bonus + age_bonus, 0.82)
+
+
+def first_zone_hit(index, current_price):
+    """
+    Primera zona (en el orden original) que contiene el precio.
+    
+    Args:
+        index: Tabla de build_zone_index()
+        current_price: Precio actual
+    
+    Returns:
+        Fila de la tabla de la zona (su índice original está en 'pos') o -1
+        si el precio no está en ninguna
+    """
+    # Solo las zonas con low <= precio pueden contenerlo
+    end = int(np.searchsorted(index['low'], current_price, side='right'))
+    if end == 0:
+        return -1
+    
+    rows = np.flatnonzero(index['high'][:end] >= current_price)
+    if rows.size == 0:
+        return -1
+    
+    return int(rows[np.argmin(index['pos'][rows])])
+
 
 class LiquiditySystem:
     """
@@ -58,14 +353,36 @@ class LiquiditySystem:
         self.ob_min_impulse_pips = 700  # Aumentado de 600
         self.ob_min_reaction_touches = 2  # Aumentado de 1 (necesita confirmación)
         
-        # 🔧 NUEVO: Cooldown interno
+        # 🔧 NUEVO: Cooldown interno (time.monotonic() de la última señal)
         self.last_signal_time = None
         self.min_signal_interval_minutes = 15  # Mínimo 15 min entre señales
         
+        # 🆕 Prioridades habilitadas (ablación / desactivar tipos de señal)
+        self.enable_max_confluence = True
+        self.enable_sweep_ob = True
+        self.enable_fvg_ob = True
+        self.enable_fvg_only = True
+        self.enable_ob_only = True
+        
         self.cached_order_blocks = []
         self.cached_fvgs = []
-        self.last_ob_calculation = None
-        self.last_fvg_calculation = None
+        
+        # 🆕 Parte de las zonas que solo depende de velas cerradas: se recalcula
+        # al cerrar una vela nueva; la vela en formación se re-evalúa por tick
+        self._last_bar_time = None
+        self._last_bar_count = 0
+        self._closed_fvgs = []
+        self._ob_candidates = None
+        self._forming_key = None
+        self._fvg_index = self._build_fvg_index([])
+        self._ob_index = self._build_ob_index([])
+        self._zone_bounds = (np.inf, -np.inf)
+        
+        # 🆕 Arrays OHLC reutilizados por todos los detectores del mismo tick
+        self._arr_cache = {}
+        
+        # 🆕 Firma (vela en formación + precio) del último tick sin señal
+        self._miss_signature = None
         
         self.session_stats = {
             'london_ny_overlap': {'signals': 0, 'executed': 0},
@@ -73,352 +390,406 @@ class LiquiditySystem:
             'ny_only': {'signals': 0, 'executed': 0},
             'asian': {'signals': 0, 'executed': 0}
         }
+        self._total_signals = 0
+        self._total_executed = 0
     
     def get_trading_session(self):
         """
         Identifica sesión actual (solo para ajustar confianza, no bloquear)
         """
-        now_utc = datetime.utcnow()
-        current_time = now_utc.time()
-        
-        london_ny_start = time(13, 0)
-        london_ny_end = time(17, 0)
-        london_start = time(8, 0)
-        london_end = time(17, 0)
-        ny_start = time(13, 0)
-        ny_end = time(22, 0)
-        asian_start = time(0, 0)
-        asian_end = time(9, 0)
-        
-        if london_ny_start <= current_time <= london_ny_end:
-            return 'london_ny_overlap', 1.0
-        elif london_start <= current_time <= london_end:
-            return 'london_only', 0.9  # Aumentado de 0.8
-        elif ny_start <= current_time <= ny_end:
-            return 'ny_only', 0.9  # Aumentado de 0.8
-        elif asian_start <= current_time <= asian_end:
-            return 'asian', 0.6  # Aumentado de 0.3 (más permisivo)
-        else:
-            return 'off_hours', 0.5  # Aumentado de 0.1
+        return _SESSION_BY_HOUR[datetime.utcnow().hour]
     
-    def detect_fair_value_gap(self, df):
+    def _prepare_arrays(self, df):
+        """
+        Extrae las columnas OHLC/time como arrays NumPy (sin copiar si ya son
+        float64) y las cachea para el DataFrame actual.
+        
+        Args:
+            df: DataFrame con open/high/low/close/time
+        
+        Returns:
+            Dict con arrays 'open', 'high', 'low', 'close' y 'time'
+        """
+        # La entrada guarda también el DataFrame: mientras siga vivo, su id()
+        # no puede reutilizarse para el DataFrame de otro tick
+        key = (id(df), len(df), df['time'].iat[-1])
+        cached = self._arr_cache.get(key)
+        arrays = cached[1] if cached is not None else None
+        
+        if arrays is None:
+            arrays = {
+                'open': df['open'].to_numpy(dtype=np.float64),
+                'high': df['high'].to_numpy(dtype=np.float64),
+                'low': df['low'].to_numpy(dtype=np.float64),
+                'close': df['close'].to_numpy(dtype=np.float64),
+                'time': df['time'].to_numpy()
+            }
+            self._arr_cache.clear()
+            self._arr_cache[key] = (df, arrays)
+        
+        return arrays
+    
+    def detect_fair_value_gap(self, data, start=2):
         """
         🆕 BALANCEADO: FVG con gap mínimo de 30 pips
+        
+        Args:
+            data: DataFrame o dict de arrays de _prepare_arrays()
+            start: Primer índice (vela 3) de la ventana a evaluar
         """
-        if len(df) < 10:
+        if not isinstance(data, dict):
+            data = self._prepare_arrays(data)
+        
+        if len(data['close']) < 10:
             return []
         
         fvgs = []
-        recent = df.tail(self.fvg_max_age_bars + 3).copy()
+        window = self.fvg_max_age_bars + 3
         
-        for i in range(2, len(recent)):
-            candle_1 = recent.iloc[i-2]
-            candle_2 = recent.iloc[i-1]
-            candle_3 = recent.iloc[i]
-            
-            # BULLISH FVG
-            if candle_3['low'] > candle_1['high']:
-                gap_size_pips = (candle_3['low'] - candle_1['high']) / 0.01
-                
-                # 🆕 Gap mínimo reducido a 30 pips
-                if gap_size_pips >= self.fvg_min_gap_pips:
-                    impulse_pips = (candle_2['close'] - candle_2['open']) / 0.01
-                    
-                    # 🆕 Impulso mínimo reducido a 20 pips
-                    if impulse_pips > 20:
-                        fvgs.append({
-                            'type': 'bullish_fvg',
-                            'gap_high': float(candle_3['low']),
-                            'gap_low': float(candle_1['high']),
-                            'gap_mid': float((candle_3['low'] + candle_1['high']) / 2),
-                            'gap_size_pips': gap_size_pips,
-                            'impulse_pips': impulse_pips,
-                            'formation_index': i,
-                            'time': candle_3['time'],
-                            'filled': False
-                        })
+        opens = data['open'][-window:]
+        highs = data['high'][-window:]
+        lows = data['low'][-window:]
+        closes = data['close'][-window:]
+        times = data['time'][-window:]
+        
+        # Vela 1 = [:-2], vela 2 = [1:-1], vela 3 = [2:]
+        bull_impulse = (closes[1:-1] - opens[1:-1]) * PIP_INV
+        bear_impulse = -bull_impulse  # (open - close): vela 2 bajista
+        
+        # BULLISH FVG
+        bull_gap = (lows[2:] - highs[:-2]) * PIP_INV
+        bull_mask = (lows[2:] > highs[:-2]) & (bull_gap >= self.fvg_min_gap_pips) & (bull_impulse > 20)
+        
+        # BEARISH FVG
+        bear_gap = (lows[:-2] - highs[2:]) * PIP_INV
+        bear_mask = (highs[2:] < lows[:-2]) & (bear_gap >= self.fvg_min_gap_pips) & (bear_impulse > 20)
+        
+        # Ambos casos son excluyentes: se recorren en orden de formación
+        for j in np.flatnonzero((bull_mask | bear_mask)[start - 2:]) + (start - 2):
+            i = int(j) + 2
             
-            # BEARISH FVG
-            elif candle_3['high'] < candle_1['low']:
-                gap_size_pips = (candle_1['low'] - candle_3['high']) / 0.01
-                
-                if gap_size_pips >= self.fvg_min_gap_pips:
-                    impulse_pips = abs((candle_2['close'] - candle_2['open']) / 0.01)
-                    
-                    if impulse_pips > 20:
-                        fvgs.append({
-                            'type': 'bearish_fvg',
-                            'gap_high': float(candle_1['low']),
-                            'gap_low': float(candle_3['high']),
-                            'gap_mid': float((candle_1['low'] + candle_3['high']) / 2),
-                            'gap_size_pips': gap_size_pips,
-                            'impulse_pips': impulse_pips,
-                            'formation_index': i,
-                            'time': candle_3['time'],
-                            'filled': False
-                        })
+            if bull_mask[j]:
+                fvgs.append(FVG(
+                    type='bullish_fvg',
+                    gap_high=float(lows[i]),
+                    gap_low=float(highs[i-2]),
+                    gap_size_pips=bull_gap[j],
+                    impulse_pips=bull_impulse[j],
+                    formation_index=i,
+                    time=times[i]
+                ))
+            else:
+                fvgs.append(FVG(
+                    type='bearish_fvg',
+                    gap_high=float(lows[i-2]),
+                    gap_low=float(highs[i]),
+                    gap_size_pips=bear_gap[j],
+                    impulse_pips=bear_impulse[j],
+                    formation_index=i,
+                    time=times[i]
+                ))
         
         return fvgs
     
-    def check_fvg_interaction(self, fvgs, current_price):
+    def _forming_index(self, data):
+        """Índice (relativo a la ventana de FVG) de la vela en formación"""
+        return min(len(data['close']), self.fvg_max_age_bars + 3) - 1
+    
+    def _detect_closed_fvgs(self, data, start=2):
+        """FVG cuya vela 3 ya cerró (excluye el triplete de la vela en formación)"""
+        forming = self._forming_index(data)
+        return [
+            fvg for fvg in self.detect_fair_value_gap(data, start=start)
+            if fvg.formation_index < forming
+        ]
+    
+    def _update_fvgs_incremental(self, data):
         """
-        🆕 BALANCEADO: Acepta todo el rango del gap (no solo 50%)
+        Actualiza los FVG de velas cerradas tras cerrar UNA vela nueva:
+        desplaza la ventana, descarta los que salen de ella y evalúa solo el
+        triplete que termina en la vela recién cerrada.
+        
+        Args:
+            data: Dict de arrays de _prepare_arrays()
+        """
+        window = self.fvg_max_age_bars + 3
+        
+        if len(data['close']) < window:
+            self._closed_fvgs = self._detect_closed_fvgs(data)
+            return
+        
+        kept = []
+        
+        for fvg in self._closed_fvgs:
+            fvg.formation_index -= 1
+            if fvg.formation_index >= 2:
+                kept.append(fvg)
+        
+        kept.extend(self._detect_closed_fvgs(data, start=window - 2))
+        self._closed_fvgs = kept
+    
+    def _refresh_zones(self, data):
+        """
+        Mantiene FVG y Order Blocks al día. Lo que solo depende de velas
+        cerradas se recalcula al aparecer una vela nueva; el triplete de FVG
+        y las reacciones de OB de la vela en formación se re-evalúan cada vez
+        que esta marca un high o low nuevo.
+        
+        Args:
+            data: Dict de arrays de _prepare_arrays()
         """
-        for fvg in fvgs:
-            if fvg['filled']:
-                continue
+        times = data['time']
+        count = len(times)
+        
+        if times[-1] != self._last_bar_time or count != self._last_bar_count:
+            one_bar_ahead = (
+                self._last_bar_time is not None and
+                count == self._last_bar_count and
+                times[-2] == self._last_bar_time
+            )
             
-            gap_range = fvg['gap_high'] - fvg['gap_low']
+            if one_bar_ahead:
+                self._update_fvgs_incremental(data)
+            else:
+                self._closed_fvgs = self._detect_closed_fvgs(data)
             
-            # 🆕 Acepta TODO el gap (antes solo 50%)
-            if fvg['gap_low'] <= current_price <= fvg['gap_high']:
-                position_in_gap = (current_price - fvg['gap_low']) / gap_range if gap_range > 0 else 0.5
-                
-                if fvg['type'] == 'bullish_fvg':
-                    # 🆕 Acepta todo el gap (antes < 0.5)
-                    confidence = 0.65 + (fvg['gap_size_pips'] / 1000) * 0.08
-                    confidence = min(confidence, 0.80)
-                    
-                    return {
-                        'signal': 1,
-                        'confidence': confidence,
-                        'fvg': fvg,
-                        'position_in_gap': position_in_gap
-                    }
-                
-                elif fvg['type'] == 'bearish_fvg':
-                    # 🆕 Acepta todo el gap (antes > 0.5)
-                    confidence = 0.65 + (fvg['gap_size_pips'] / 1000) * 0.08
-                    confidence = min(confidence, 0.80)
-                    
-                    return {
-                        'signal': -1,
-                        'confidence': confidence,
-                        'fvg': fvg,
-                        'position_in_gap': position_in_gap
-                    }
+            self._ob_candidates = self._scan_ob_candidates(data)
+            self._forming_key = None
+            self._last_bar_time = times[-1]
+            self._last_bar_count = count
         
-        return None
+        # El triplete final y las reacciones solo leen high/low de la vela en formación
+        forming_key = (data['high'][-1], data['low'][-1])
+        if forming_key == self._forming_key:
+            return
+        self._forming_key = forming_key
+        
+        self.cached_fvgs = self._closed_fvgs + self.detect_fair_value_gap(
+            data, start=max(self._forming_index(data), 2)
+        )
+        self.cached_order_blocks = self._select_order_blocks(self._ob_candidates, *forming_key)
+        
+        self._fvg_index = self._build_fvg_index(self.cached_fvgs)
+        self._ob_index = self._build_ob_index(self.cached_order_blocks)
+        
+        # Envolvente de todas las zonas: fuera de ella no hay interacción posible
+        lows = np.concatenate((self._fvg_index['low'], self._ob_index['low']))
+        highs = np.concatenate((self._fvg_index['high'], self._ob_index['high']))
+        self._zone_bounds = (lows.min(), highs.max()) if lows.size else (np.inf, -np.inf)
+    
+    def _build_fvg_index(self, fvgs):
+        """Tabla de zonas de FVG con la confianza base precalculada"""
+        table = build_zone_index(fvgs, 'gap_low', 'gap_high', 'gap_size_pips')
+        table['confidence'] = fvg_confidence(table['size_pips'])
+        return table
     
-    def detect_liquidity_sweep_enhanced(self, df, current_price):
+    def _build_ob_index(self, order_blocks):
+        """Tabla de zonas de Order Blocks con la confianza base precalculada"""
+        table = build_zone_index(order_blocks, 'zone_low', 'zone_high', 'strength')
+        reactions = np.array([order_blocks[i].reaction_count for i in table['pos']], dtype=np.int64)
+        ages = np.array([order_blocks[i].age_bars for i in table['pos']], dtype=np.int64)
+        table['confidence'] = order_block_confidence(table['size_pips'], reactions, ages)
+        return table
+    
+    def check_fvg_interaction(self, fvgs, current_price, index=None):
         """
-        🆕 BALANCEADO: Sweep con mecha mínima de 700 pips
+        🆕 BALANCEADO: Acepta todo el rango del gap (no solo 50%)
+        
+        Args:
+            fvgs: Lista de FVG detectados
+            current_price: Precio actual
+            index: Tabla ordenada de build_zone_index() (opcional)
         """
-        if len(df) < self.lookback_bars:
+        if index is None:
+            index = self._build_fvg_index(fvgs)
+        
+        # 🆕 Búsqueda binaria en lugar de recorrer todos los gaps
+        row = first_zone_hit(index, current_price)
+        if row < 0:
             return None
         
-        recent = df.tail(self.lookback_bars).copy()
+        fvg = fvgs[index['pos'][row]]
+        gap_range = fvg.gap_high - fvg.gap_low
         
-        recent_high = recent['high'].max()
-        recent_low = recent['low'].min()
+        # 🆕 Acepta TODO el gap (antes solo 50%)
+        position_in_gap = (current_price - fvg.gap_low) / gap_range if gap_range > 0 else 0.5
         
-        current_candle = df.iloc[-1]
+        if fvg.type not in ('bullish_fvg', 'bearish_fvg'):
+            return None
         
-        candle_open = current_candle['open']
-        candle_close = current_candle['close']
-        candle_high = current_candle['high']
-        candle_low = current_candle['low']
+        return {
+            'signal': 1 if fvg.type == 'bullish_fvg' else -1,
+            'confidence': index['confidence'][row],
+            'fvg': fvg,
+            'position_in_gap': position_in_gap
+        }
+    
+    def detect_liquidity_sweep_enhanced(self, data, current_price, session_info=None):
+        """
+        🆕 BALANCEADO: Sweep con mecha mínima de 700 pips
         
-        session, session_priority = self.get_trading_session()
+        Args:
+            data: DataFrame o dict de arrays de _prepare_arrays()
+            current_price: Precio actual
+            session_info: Tupla (session, priority) ya calculada (opcional)
+        """
+        if not isinstance(data, dict):
+            data = self._prepare_arrays(data)
         
-        # BULLISH SWEEP
-        if candle_low <= recent_low + (self.sweep_tolerance_pips * 0.1):
-            
-            lower_wick_size_pips = (min(candle_open, candle_close) - candle_low) / 0.1
-            
-            # 🆕 Mecha mínima reducida a 700 pips
-            if lower_wick_size_pips >= self.min_wick_size_pips:
-                
-                distance_from_sweep = (current_price - candle_low) / 0.1
-                
-                # 🆕 Distancia mínima reducida a 80 pips
-                if distance_from_sweep >= self.min_distance_from_sweep_pips:
-                    
-                    base_confidence = 0.68 + (lower_wick_size_pips - 700) * 0.00008
-                    base_confidence = min(base_confidence, 0.82)
-                    
-                    # 🆕 Ajuste de sesión menos agresivo
-                    session_confidence = base_confidence * (0.85 + session_priority * 0.15)
-                    
-                    return {
-                        'type': 'bullish_sweep',
-                        'swept_level': candle_low,
-                        'wick_size': lower_wick_size_pips,
-                        'distance_from_sweep': distance_from_sweep,
-                        'confidence': session_confidence,
-                        'current_price': current_price,
-                        'session': session,
-                        'session_priority': session_priority
-                    }
+        if len(data['close']) < self.lookback_bars:
+            return None
         
-        # BEARISH SWEEP
-        if candle_high >= recent_high - (self.sweep_tolerance_pips * 0.01):
-            
-            upper_wick_size_pips = (candle_high - max(candle_open, candle_close)) / 0.01
-            
-            if upper_wick_size_pips >= self.min_wick_size_pips:
-                
-                distance_from_sweep = (candle_high - current_price) / 0.01
-                
-                if distance_from_sweep >= self.min_distance_from_sweep_pips:
-                    
-                    base_confidence = 0.68 + (upper_wick_size_pips - 700) * 0.00008
-                    base_confidence = min(base_confidence, 0.82)
-                    
-                    session_confidence = base_confidence * (0.85 + session_priority * 0.15)
-                    
-                    return {
-                        'type': 'bearish_sweep',
-                        'swept_level': candle_high,
-                        'wick_size': upper_wick_size_pips,
-                        'distance_from_sweep': distance_from_sweep,
-                        'confidence': session_confidence,
-                        'current_price': current_price,
-                        'session': session,
-                        'session_priority': session_priority
-                    }
+        result = sweep_kernel(
+            data['open'], data['high'], data['low'], data['close'], current_price,
+            self.lookback_bars, self.sweep_tolerance_pips,
+            self.min_wick_size_pips, self.min_distance_from_sweep_pips
+        )
         
-        return None
+        if result is None:
+            return None
+        
+        direction, swept_level, wick_size, distance_from_sweep, base_confidence = result
+        sweep_type = 'bullish_sweep' if direction == 1 else 'bearish_sweep'
+        
+        session, session_priority = session_info or self.get_trading_session()
+        
+        # 🆕 Ajuste de sesión menos agresivo
+        session_confidence = base_confidence * (0.85 + session_priority * 0.15)
+        
+        return {
+            'type': sweep_type,
+            'swept_level': swept_level,
+            'wick_size': wick_size,
+            'distance_from_sweep': distance_from_sweep,
+            'confidence': session_confidence,
+            'current_price': current_price,
+            'session': session,
+            'session_priority': session_priority
+        }
     
-    def find_order_blocks_enhanced(self, df):
+    def find_order_blocks_enhanced(self, data):
         """
         🆕 BALANCEADO: OB con impulso mínimo de 600 pips y solo 1 reacción
+        
+        Args:
+            data: DataFrame o dict de arrays de _prepare_arrays()
+        """
+        if not isinstance(data, dict):
+            data = self._prepare_arrays(data)
+        
+        return self._select_order_blocks(
+            self._scan_ob_candidates(data), data['high'][-1], data['low'][-1]
+        )
+    
+    def _scan_ob_candidates(self, data):
+        """
+        Candidatos a OB de las últimas 50 velas con sus reacciones en velas
+        cerradas (None si no hay datos suficientes).
+        
+        Args:
+            data: Dict de arrays de _prepare_arrays()
+        """
+        if len(data['close']) < 50:
+            return None
+        
+        highs = data['high'][-50:]
+        lows = data['low'][-50:]
+        
+        is_bullish, formation, move_pips, reactions = scan_order_block_candidates(
+            data['open'][-50:], highs, lows, data['close'][-50:],
+            self.ob_min_impulse_pips
+        )
+        
+        return {
+            'is_bullish': is_bullish,
+            'formation': formation,
+            'move_pips': move_pips,
+            'closed_reactions': reactions,
+            'zone_high': highs[formation],
+            'zone_low': lows[formation],
+            'time': data['time'][-50:][formation],
+            'age_bars': len(highs) - formation
+        }
+    
+    def _select_order_blocks(self, candidates, high, low):
         """
-        if len(df) < 50:
+        Suma la reacción de la vela en formación, filtra por reacciones mínimas
+        y devuelve el top-8 de Order Blocks.
+        
+        Args:
+            candidates: Dict de _scan_ob_candidates() o None
+            high, low: High/low actuales de la vela en formación
+        """
+        if candidates is None:
             return []
         
-        recent = df.tail(50).copy()
-        order_blocks = []
+        reactions = candidates['closed_reactions'] + forming_bar_reactions(
+            candidates['is_bullish'], candidates['zone_low'], candidates['zone_high'],
+            high, low
+        )
+        keep = np.flatnonzero(reactions >= self.ob_min_reaction_touches)
         
-        for i in range(5, len(recent) - 5):
-            current = recent.iloc[i]
-            next_candles = recent.iloc[i+1:i+4]
-            
-            # BULLISH ORDER BLOCK
-            if current['close'] < current['open']:
-                bullish_impulse = sum(1 for idx in range(len(next_candles)) 
-                                     if next_candles.iloc[idx]['close'] > next_candles.iloc[idx]['open'])
-                
-                total_move = next_candles.iloc[-1]['close'] - current['low']
-                move_pips = total_move / 0.01
-                
-                # 🆕 Impulso mínimo reducido a 600 pips
-                if bullish_impulse >= 2 and move_pips > self.ob_min_impulse_pips:
-                    
-                    ob_zone_high = current['high']
-                    ob_zone_low = current['low']
-                    
-                    future_candles = recent.iloc[i+4:]
-                    reaction_count = 0
-                    
-                    for future_idx in range(len(future_candles)):
-                        future = future_candles.iloc[future_idx]
-                        if ob_zone_low <= future['low'] <= ob_zone_high:
-                            reaction_count += 1
-                    
-                    # 🆕 Solo requiere 1 reacción (antes 2)
-                    if reaction_count >= self.ob_min_reaction_touches:
-                        order_blocks.append({
-                            'type': 'bullish_ob',
-                            'zone_high': float(ob_zone_high),
-                            'zone_low': float(ob_zone_low),
-                            'zone_mid': float((ob_zone_high + ob_zone_low) / 2),
-                            'strength': move_pips,
-                            'reaction_count': reaction_count,
-                            'formation_index': i,
-                            'time': current['time'],
-                            'age_bars': len(recent) - i
-                        })
-            
-            # BEARISH ORDER BLOCK
-            elif current['close'] > current['open']:
-                bearish_impulse = sum(1 for idx in range(len(next_candles)) 
-                                     if next_candles.iloc[idx]['close'] < next_candles.iloc[idx]['open'])
-                
-                total_move = current['high'] - next_candles.iloc[-1]['close']
-                move_pips = total_move / 0.01
-                
-                if bearish_impulse >= 2 and move_pips > self.ob_min_impulse_pips:
-                    
-                    ob_zone_high = current['high']
-                    ob_zone_low = current['low']
-                    
-                    future_candles = recent.iloc[i+4:]
-                    reaction_count = 0
-                    
-                    for future_idx in range(len(future_candles)):
-                        future = future_candles.iloc[future_idx]
-                        if ob_zone_low <= future['high'] <= ob_zone_high:
-                            reaction_count += 1
-                    
-                    if reaction_count >= self.ob_min_reaction_touches:
-                        order_blocks.append({
-                            'type': 'bearish_ob',
-                            'zone_high': float(ob_zone_high),
-                            'zone_low': float(ob_zone_low),
-                            'zone_mid': float((ob_zone_high + ob_zone_low) / 2),
-                            'strength': move_pips,
-                            'reaction_count': reaction_count,
-                            'formation_index': i,
-                            'time': current['time'],
-                            'age_bars': len(recent) - i
-                        })
-        
-        order_blocks.sort(key=lambda x: (x['reaction_count'], x['strength'], -x['age_bars']), reverse=True)
-        
-        return order_blocks[:8]  # 🆕 Aumentado de 5 a 8
-    
-    def check_order_block_touch_enhanced(self, order_blocks, current_price):
+        reactions = reactions[keep]
+        move_pips = candidates['move_pips'][keep]
+        age_bars = candidates['age_bars'][keep]
+        
+        # Prioridad: más reacciones, más fuerza, más reciente (lexsort: última clave manda)
+        top = np.lexsort((age_bars, -move_pips, -reactions))[:8]  # 🆕 Aumentado de 5 a 8
+        
+        return [
+            OrderBlock(
+                type='bullish_ob' if candidates['is_bullish'][keep[k]] else 'bearish_ob',
+                zone_high=float(candidates['zone_high'][keep[k]]),
+                zone_low=float(candidates['zone_low'][keep[k]]),
+                strength=move_pips[k],
+                reaction_count=int(reactions[k]),
+                formation_index=int(candidates['formation'][keep[k]]),
+                time=candidates['time'][keep[k]],
+                age_bars=int(age_bars[k])
+            )
+            for k in top
+        ]
+    
+    def check_order_block_touch_enhanced(self, order_blocks, current_price, index=None):
         """
         🆕 BALANCEADO: Acepta todo el rango del OB
+        
+        Args:
+            order_blocks: Lista de Order Blocks ordenada por prioridad
+            current_price: Precio actual
+            index: Tabla ordenada de build_zone_index() (opcional)
         """
-        for ob in order_blocks:
-            zone_range = ob['zone_high'] - ob['zone_low']
-            
-            # 🆕 Acepta TODO el rango del OB
-            if ob['zone_low'] <= current_price <= ob['zone_high']:
-                position = (current_price - ob['zone_low']) / zone_range if zone_range > 0 else 0.5
-                
-                if ob['type'] == 'bullish_ob':
-                    # 🆕 Todo el OB es válido (antes < 0.6)
-                    base_confidence = 0.62
-                    
-                    strength_bonus = min((ob['strength'] / 2000) * 0.08, 0.08)
-                    reaction_bonus = min((ob['reaction_count'] / 5) * 0.06, 0.06)
-                    age_bonus = max(0, (20 - ob['age_bars']) / 20 * 0.04)
-                    
-                    confidence = base_confidence + strength_bonus + reaction_bonus + age_bonus
-                    confidence = min(confidence, 0.82)
-                    
-                    return {
-                        'signal': 1,
-                        'confidence': confidence,
-                        'ob': ob,
-                        'position_in_zone': position
-                    }
-                
-                elif ob['type'] == 'bearish_ob':
-                    # 🆕 Todo el OB es válido (antes > 0.4)
-                    base_confidence = 0.62
-                    strength_bonus = min((ob['strength'] / 2000) * 0.08, 0.08)
-                    reaction_bonus = min((ob['reaction_count'] / 5) * 0.06, 0.06)
-                    age_bonus = max(0, (20 - ob['age_bars']) / 20 * 0.04)
-                    
-                    confidence = base_confidence + strength_bonus + reaction_bonus + age_bonus
-                    confidence = min(confidence, 0.82)
-                    
-                    return {
-                        'signal': -1,
-                        'confidence': confidence,
-                        'ob': ob,
-                        'position_in_zone': position
-                    }
+        if index is None:
+            index = self._build_ob_index(order_blocks)
         
-        return None
+        # 🆕 Búsqueda binaria en lugar de recorrer todos los OB
+        row = first_zone_hit(index, current_price)
+        if row < 0:
+            return None
+        
+        ob = order_blocks[index['pos'][row]]
+        zone_range = ob.zone_high - ob.zone_low
+        
+        # 🆕 Acepta TODO el rango del OB
+        position = (current_price - ob.zone_low) / zone_range if zone_range > 0 else 0.5
+        
+        if ob.type not in ('bullish_ob', 'bearish_ob'):
+            return None
+        
+        return {
+            'signal': 1 if ob.type == 'bullish_ob' else -1,
+            'confidence': index['confidence'][row],
+            'ob': ob,
+            'position_in_zone': position
+        }
     
-    def calculate_confluence_score(self, signal_data, fvg_signal, ob_signal, sweep_data):
+    def calculate_confluence_score(self, signal_data, fvg_signal, ob_signal, sweep_data,
+                                   session_info=None):
         """
         Sistema de Confluence Scoring
+        
+        Args:
+            session_info: Tupla (session, priority) ya calculada (opcional)
         """
         confluence_factors = []
         base_confidence = signal_data['confidence']
@@ -435,7 +806,7 @@ class LiquiditySystem:
             confluence_factors.append('SWEEP')
             base_confidence += 0.03
         
-        session, session_priority = self.get_trading_session()
+        session, session_priority = session_info or self.get_trading_session()
         if session == 'london_ny_overlap':
             confluence_factors.append('LONDON_NY')
             base_confidence += 0.05  # Reducido de 0.07
@@ -465,41 +836,55 @@ class LiquiditySystem:
         if not self.enabled or len(df) < 50:
             return None
         
+        now = time.monotonic()
+        
         # 🔧 NUEVO: Cooldown interno (máximo 1 señal cada 15 min)
-        if self.last_signal_time:
-            minutes_since_last = (datetime.now() - self.last_signal_time).total_seconds() / 60
-            if minutes_since_last < self.min_signal_interval_minutes:
+        if self.last_signal_time is not None:
+            if now - self.last_signal_time < self.min_signal_interval_minutes * 60:
                 return None  # Esperar mínimo intervalo
         
-        session, session_priority = self.get_trading_session()
+        arrays = self._prepare_arrays(df)
         
-        # 1. DETECTAR FAIR VALUE GAPS (cache más inteligente)
-        now = datetime.now()
-        if (self.last_fvg_calculation is None or 
-            (now - self.last_fvg_calculation).total_seconds() > 120):  # Cada 2 min
-            self.cached_fvgs = self.detect_fair_value_gap(df)
-            self.last_fvg_calculation = now
+        # 🆕 Mismo estado de vela y mismo precio que el último tick sin señal:
+        # el resultado es idéntico (las ramas no dependen de la sesión)
+        signature = (
+            len(arrays['time']), arrays['time'][-1], current_price,
+            arrays['open'][-1], arrays['high'][-1], arrays['low'][-1], arrays['close'][-1]
+        )
+        if signature == self._miss_signature:
+            return None
+        
+        # 🆕 Sesión calculada una sola vez por tick
+        session_info = self.get_trading_session()
+        session, session_priority = session_info
         
-        fvg_signal = self.check_fvg_interaction(self.cached_fvgs, current_price)
+        # 1-2. FAIR VALUE GAPS + ORDER BLOCKS (caché por hora de la última vela,
+        # no por reloj: sin TTL de 120 s)
+        self._refresh_zones(arrays)
         
-        # 2. DETECTAR ORDER BLOCKS (cache más inteligente)
-        if (self.last_ob_calculation is None or 
-            (now - self.last_ob_calculation).total_seconds() > 120):  # Cada 2 min
-            self.cached_order_blocks = self.find_order_blocks_enhanced(df)
-            self.last_ob_calculation = now
+        zone_low, zone_high = self._zone_bounds
         
-        ob_signal = self.check_order_block_touch_enhanced(self.cached_order_blocks, current_price)
+        if zone_low <= current_price <= zone_high:
+            fvg_signal = self.check_fvg_interaction(self.cached_fvgs, current_price, self._fvg_index)
+            ob_signal = self.check_order_block_touch_enhanced(
+                self.cached_order_blocks, current_price, self._ob_index
+            )
+        else:
+            # 🆕 Precio fuera de todas las zonas: solo puede haber sweep
+            fvg_signal = ob_signal = None
         
         # 3. DETECTAR LIQUIDITY SWEEPS
-        sweep = self.detect_liquidity_sweep_enhanced(df, current_price)
+        sweep = self.detect_liquidity_sweep_enhanced(arrays, current_price, session_info)
         
         # ═══════════════════════════════════════════════════════════
         # PRIORIDAD 1: MÁXIMA CONFLUENCIA (FVG + OB + Sweep)
         # ═══════════════════════════════════════════════════════════
-        if fvg_signal and ob_signal and sweep:
+        if self.enable_max_confluence and fvg_signal and ob_signal and sweep:
             if fvg_signal['signal'] == ob_signal['signal'] == (1 if sweep['type'] == 'bullish_sweep' else -1):
-                signal_data = fvg_signal.copy()
-                confluence = self.calculate_confluence_score(signal_data, fvg_signal, ob_signal, sweep)
+                signal_data = fvg_signal
+                confluence = self.calculate_confluence_score(
+                    signal_data, fvg_signal, ob_signal, sweep, session_info
+                )
                 
                 # 🔧 MEJORA: Confianza más realista
                 final_confidence = min(0.78, confluence['final_confidence'])  # Cap en 78%
@@ -507,6 +892,7 @@ class LiquiditySystem:
                 direction = "BUY" if signal_data['signal'] == 1 else "SELL"
                 
                 self.last_signal_time = now
+                self._record_signal(session)
                 
                 return {
                     'signal': signal_data['signal'],
@@ -523,12 +909,14 @@ class LiquiditySystem:
         # ═══════════════════════════════════════════════════════════
         # PRIORIDAD 2: SWEEP + ORDER BLOCK (muy confiable)
         # ═══════════════════════════════════════════════════════════
-        if sweep and ob_signal:
+        if self.enable_sweep_ob and sweep and ob_signal:
             sweep_signal = 1 if sweep['type'] == 'bullish_sweep' else -1
             
             if sweep_signal == ob_signal['signal']:
-                signal_data = ob_signal.copy()
-                confluence = self.calculate_confluence_score(signal_data, None, ob_signal, sweep)
+                signal_data = ob_signal
+                confluence = self.calculate_confluence_score(
+                    signal_data, None, ob_signal, sweep, session_info
+                )
                 
                 # 🔧 MEJORA: Confianza más conservadora
                 final_confidence = min(0.75, confluence['final_confidence'])
@@ -536,6 +924,7 @@ class LiquiditySystem:
                 direction = "BUY" if signal_data['signal'] == 1 else "SELL"
                 
                 self.last_signal_time = now
+                self._record_signal(session)
                 
                 return {
                     'signal': signal_data['signal'],
@@ -552,10 +941,12 @@ class LiquiditySystem:
         # ═══════════════════════════════════════════════════════════
         # PRIORIDAD 3: FVG + ORDER BLOCK (confluencia media)
         # ═══════════════════════════════════════════════════════════
-        if fvg_signal and ob_signal:
+        if self.enable_fvg_ob and fvg_signal and ob_signal:
             if fvg_signal['signal'] == ob_signal['signal']:
-                signal_data = fvg_signal.copy()
-                confluence = self.calculate_confluence_score(signal_data, fvg_signal, ob_signal, None)
+                signal_data = fvg_signal
+                confluence = self.calculate_confluence_score(
+                    signal_data, fvg_signal, ob_signal, None, session_info
+                )
                 
                 final_confidence = min(0.72, confluence['final_confidence'])
                 direction = "BUY" if signal_data['signal'] == 1 else "SELL"
@@ -563,6 +954,7 @@ class LiquiditySystem:
                 ob = ob_signal['ob']
                 
                 self.last_signal_time = now
+                self._record_signal(session)
                 
                 return {
                     'signal': signal_data['signal'],
@@ -574,79 +966,97 @@ class LiquiditySystem:
                     'confluence_factors': confluence['confluence_factors'],
                     'confluence_count': 2,
                     'session': confluence['session'],
-                    'fvg_size': fvg['gap_size_pips'],
-                    'ob_strength': ob['strength']
+                    'fvg_size': fvg.gap_size_pips,
+                    'ob_strength': ob.strength
                 }
         
         # ═══════════════════════════════════════════════════════════
         # PRIORIDAD 4: FVG SOLO (muy selectivo)
         # ═══════════════════════════════════════════════════════════
-        if fvg_signal:
+        if self.enable_fvg_only and fvg_signal:
             fvg = fvg_signal['fvg']
             
             # 🔧 MEJORA: Solo si es RECIENTE y GRANDE
             # Calcular edad del FVG basado en su índice de formación
             if self.cached_fvgs:
                 current_index = len(df) - 1
-                formation_index = fvg.get('formation_index', 0)
+                formation_index = fvg.formation_index
                 age = current_index - formation_index
             else:
                 age = 50  # Default si no hay FVGs cacheados
             
             # Solo FVG de hace menos de 15 velas y gap > 50 pips
-            if age < 15 and fvg['gap_size_pips'] > 50:
+            if age < 15 and fvg.gap_size_pips > 50:
                 
                 direction = "BUY" if fvg_signal['signal'] == 1 else "SELL"
-                final_confidence = min(0.68, 0.65 + (fvg['gap_size_pips'] / 1000) * 0.08)
+                final_confidence = min(0.68, 0.65 + (fvg.gap_size_pips / 1000) * 0.08)
                 
                 self.last_signal_time = now
+                self._record_signal(session)
                 
                 return {
                     'signal': fvg_signal['signal'],
                     'confidence': final_confidence,
-                    'reason': f"Liquidez: FVG {direction} - Gap {fvg['gap_size_pips']:.0f}p (RECIENTE)",
+                    'reason': f"Liquidez: FVG {direction} - Gap {fvg.gap_size_pips:.0f}p (RECIENTE)",
                     'sl_pips': 55,
                     'tp_pips': 120,
                     'liquidity_type': 'fvg_only',
                     'confluence_factors': ['gap_size', 'recency'],
                     'confluence_count': 1,
                     'session': session,
-                    'fvg_size': fvg['gap_size_pips']
+                    'fvg_size': fvg.gap_size_pips
                 }
         
         # ═══════════════════════════════════════════════════════════
         # PRIORIDAD 5: ORDER BLOCK SOLO (menos confiable, muy selectivo)
         # ═══════════════════════════════════════════════════════════
-        if ob_signal:
+        if self.enable_ob_only and ob_signal:
             ob = ob_signal['ob']
             
             # 🔧 MEJORA: Solo si hay MÚLTIPLES reacciones
-            if ob['reaction_count'] >= 2:
+            if ob.reaction_count >= 2:
                 
                 final_confidence = min(0.70, ob_signal['confidence'])
                 direction = "BUY" if ob_signal['signal'] == 1 else "SELL"
                 
                 self.last_signal_time = now
+                self._record_signal(session)
                 
                 return {
                     'signal': ob_signal['signal'],
                     'confidence': final_confidence,
-                    'reason': f"Liquidez: OB {direction} - {ob['reaction_count']} reacciones",
+                    'reason': f"Liquidez: OB {direction} - {ob.reaction_count} reacciones",
                     'sl_pips': 55,
                     'tp_pips': 115,
                     'liquidity_type': 'ob_only',
                     'confluence_factors': ['order_block', 'reactions'],
                     'confluence_count': 1,
                     'session': session,
-                    'ob_strength': ob['strength']
+                    'ob_strength': ob.strength
                 }
         
+        self._miss_signature = signature
         return None
     
+    def _record_signal(self, session):
+        """Registra una señal generada en su sesión y en el total"""
+        self.session_stats.setdefault(session, {'signals': 0, 'executed': 0})['signals'] += 1
+        self._total_signals += 1
+    
+    def register_signal_executed(self, session=None):
+        """
+        Registra una señal de liquidez ejecutada (orden abierta) en su sesión
+        y en el total. Sin sesión se usa la sesión actual.
+        """
+        if session is None:
+            session = self.get_trading_session()[0]
+        self.session_stats.setdefault(session, {'signals': 0, 'executed': 0})['executed'] += 1
+        self._total_executed += 1
+    
     def get_stats(self):
         """Retorna estadísticas del sistema"""
-        total_signals = sum(s['signals'] for s in self.session_stats.values())
-        total_executed = sum(s['executed'] for s in self.session_stats.values())
+        total_signals = self._total_signals
+        total_executed = self._total_executed
         
         return {
             'total_signals': total_signals,
@@ -10,16 +10,18 @@
 """
 
 import os
+import atexit
+import hashlib
 import pickle
 import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed, dump, load
 import MetaTrader5 as mt5
 from datetime import datetime
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.neural_network import MLPClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from sklearn.model_selection import train_test_split
 
 from config import (
     DATA_DIR, MODELS_DIR,
@@ -30,6 +32,197 @@ from config import (
     NN_HIDDEN_LAYERS, NN_ACTIVATION, NN_MAX_ITER
 )
 
+# Features de entrenamiento/predicción (orden fijo) y columna objetivo
+FEATURE_COLUMNS = (
+    'ema_21', 'ema_50', 'atr', 'adx', 'rsi', 'macd',
+    'macd_signal', 'momentum', 'price_to_ema21',
+    'price_to_ema50', 'ema_diff', 'bb_position', 'volume_change'
+)
+TARGET_COLUMN = 'target'
+
+# Desplazamiento de la media (en desviaciones) que obliga a re-ajustar el scaler
+SCALER_DRIFT_TOLERANCE = 0.05
+
+# Rotaciones que se conservan en el historial
+ROTATION_HISTORY_SIZE = 20
+
+# Compresión de los estimadores en disco (zlib nivel 3: los árboles del
+# RandomForest son arrays de enteros muy repetitivos)
+MODEL_COMPRESSION = ('zlib', 3)
+
+
+def atomic_write(path, write_fn):
+    """
+    Escribe en {path}.tmp y lo renombra sobre path, de modo que un
+    corte a mitad de escritura no deja el archivo corrupto
+    
+    Args:
+        path: Archivo destino
+        write_fn: Función que recibe la ruta temporal y la escribe
+    """
+    tmp_path = path + ".tmp"
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def dump_json(data, path):
+    """Guarda data como JSON compacto en path"""
+    # Compacto: lo escribe y lo lee la máquina (ver export_config)
+    with open(path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+
+def scale_row(x, mean, scale, out):
+    """
+    Estandariza una fila igual que StandardScaler.transform, sin la
+    validación ni las copias de sklearn
+    
+    Args:
+        x: Array 1D con las features en el orden de entrenamiento
+        mean: scaler.mean_
+        scale: scaler.scale_
+        out: Buffer preasignado donde se escribe el resultado
+    
+    Returns:
+        out
+    """
+    np.subtract(x, mean, out=out)
+    np.divide(out, scale, out=out)
+    return out
+
+
+# ══════════ Indicadores (réplica vectorizada de la librería ta) ══════════
+# Los modelos se entrenan con ta (main.calculate_indicators): estas
+# funciones reproducen sus fórmulas, incluidas las particularidades de
+# ATR/ADX, para que las features en vivo coincidan con las de entrenamiento.
+
+def ema(close, window):
+    return close.ewm(span=window, min_periods=window, adjust=False).mean()
+
+
+def wilder_mean(seed, values, window):
+    """
+    Suavizado de Wilder: y[0] = seed, y[i] = (y[i-1] * (window-1) + x[i]) / window
+    
+    Returns:
+        np.ndarray de longitud len(values) + 1
+    """
+    series = pd.Series(np.concatenate(([seed], values)))
+    return series.ewm(alpha=1.0 / window, adjust=False).mean().to_numpy()
+
+
+def wilder_sum(seed, values, window):
+    """Suma de Wilder: y[0] = seed, y[i] = y[i-1] - y[i-1] / window + x[i]"""
+    return wilder_mean(seed / window, values, window) * window
+
+
+def average_true_range(high, low, close, window=14):
+    """ATR como ta: ceros hasta window-1 y semilla = media del primer tramo"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    
+    true_range = high - low
+    prev_close = close[:-1]
+    true_range[1:] = np.maximum(
+        true_range[1:],
+        np.maximum(np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close))
+    )
+    
+    atr = np.zeros(len(close))
+    if len(close) >= window:
+        atr[window - 1:] = wilder_mean(true_range[:window].mean(), true_range[window:], window)
+    return atr
+
+
+def average_directional_index(high, low, close, window=14):
+    """
+    ADX como ta.trend.adx (incluye que el último tramo suavizado quede a
+    cero y que el ADX de cada vela use el DX de la anterior)
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    
+    if n <= 2 * window:
+        return np.full(n, np.nan)
+    
+    length = n - window + 1
+    
+    # Índice 0 sin vela previa (ta lo descarta con dropna)
+    prev_close = close[:-1]
+    directional_movement = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+    diff_up = high[1:] - high[:-1]
+    diff_down = low[:-1] - low[1:]
+    pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+    neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+    
+    def smooth(values):
+        out = np.zeros(length)
+        out[:length - 1] = wilder_sum(values[:window].sum(), values[window:length + window - 2], window)
+        return out
+    
+    trs = smooth(directional_movement)
+    dip = smooth(pos)
+    din = smooth(neg)
+    
+    nonzero = trs != 0
+    di_pos = np.zeros(length)
+    di_neg = np.zeros(length)
+    np.divide(100 * dip, trs, out=di_pos, where=nonzero)
+    np.divide(100 * din, trs, out=di_neg, where=nonzero)
+    
+    di_sum = di_pos + di_neg
+    dx = np.zeros(length)
+    np.divide(100 * np.abs(di_pos - di_neg), di_sum, out=dx, where=di_sum != 0)
+    
+    adx = np.zeros(length)
+    adx[window:] = wilder_mean(dx[:window].mean(), dx[window:length - 1], window)
+    
+    return np.concatenate((np.zeros(window - 1), adx))
+
+
+def relative_strength_index(close, window=14):
+    diff = close.diff(1)
+    up_direction = diff.where(diff > 0, 0.0)
+    down_direction = -diff.where(diff < 0, 0.0)
+    emaup = up_direction.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    emadn = down_direction.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    relative_strength = emaup / emadn
+    return pd.Series(
+        np.where(emadn == 0, 100, 100 - (100 / (1 + relative_strength))),
+        index=close.index
+    )
+
+
+def evaluate_model(model, X_test_scaled, y_test):
+    """Métricas de test de un modelo entrenado"""
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+    
+    y_pred_test = model.predict(X_test_scaled)
+    
+    return {
+        "test_accuracy": accuracy_score(y_test, y_pred_test),
+        "precision": precision_score(y_test, y_pred_test, average='weighted', zero_division=0),
+        "recall": recall_score(y_test, y_pred_test, average='weighted', zero_division=0),
+        "f1_score": f1_score(y_test, y_pred_test, average='weighted', zero_division=0)
+    }
+
+
+def fit_one_model(name, model, X_train_scaled, y_train, X_test_scaled, y_test):
+    """
+    Entrena y evalúa un modelo (se ejecuta en un worker de joblib)
+    
+    Returns:
+        tuple: (name, modelo entrenado o None, métricas o {"error": ...})
+    """
+    try:
+        model.fit(X_train_scaled, y_train)
+        return name, model, evaluate_model(model, X_test_scaled, y_test)
+    except Exception as e:
+        return name, None, {"error": str(e)}
+
 
 class MLEnsemble:
     """
@@ -41,7 +234,22 @@ class MLEnsemble:
     - Boost de confianza por alineación
     """
     
+    # Operaciones acumuladas antes de volver a escribir los pickles
+    FLUSH_EVERY = 50
+    
+    # Parámetro que crece y cuánto por actualización incremental (warm_start)
+    WARM_START_TREES = {
+        "random_forest": ("n_estimators", 10),
+        "gradient_boost": ("max_iter", 5)
+    }
+    
     def __init__(self, data_dir=DATA_DIR, logger=None):
+        # sklearn se importa aquí y no a nivel de módulo: métricas y
+        # train_test_split solo se cargan si se llega a entrenar
+        from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+        from sklearn.neural_network import MLPClassifier
+        from sklearn.preprocessing import StandardScaler
+        
         self.data_dir = data_dir
         self.models_dir = MODELS_DIR
         self.logger = logger
@@ -68,10 +276,12 @@ class MLEnsemble:
                 "weight": 1.0
             },
             "gradient_boost": {
-                "model": GradientBoostingClassifier(
-                    n_estimators=GB_N_ESTIMATORS,
+                # 🔧 Histogramas: mismo boosting, entrenamiento mucho más rápido
+                "model": HistGradientBoostingClassifier(
+                    max_iter=GB_N_ESTIMATORS,
                     max_depth=GB_MAX_DEPTH,
                     learning_rate=GB_LEARNING_RATE,
+                    early_stopping=True,
                     random_state=42
                 ),
                 "performance": {"accuracy": 0, "trades": 0, "profit": 0},
@@ -89,8 +299,19 @@ class MLEnsemble:
             }
         }
         
+        # Estimadores sin entrenar con la configuración actual: cada
+        # entrenamiento completo parte de un clon (descarta lo añadido con
+        # warm_start y sustituye modelos guardados de otra clase)
+        self._templates = {name: data["model"] for name, data in self.models.items()}
+        
         self.active_model = self.model_names[0]
-        self.use_ensemble_voting = True
+        
+        # Votación opcional: carga los tres modelos y los mantiene en memoria
+        # (anula el LRU de un solo modelo). Aplica al validador y al MTF
+        self.use_ensemble_voting = False
+        
+        # Peso por precisión (%): primer umbral superado en orden descendente
+        self._weight_thresholds = [(60, 1.5), (50, 1.0), (float("-inf"), 0.5)]
         
         # 🆕 MTF: Configuración de timeframes
         self.mtf_timeframes = {
@@ -103,6 +324,16 @@ class MLEnsemble:
         self.mtf_cache = {}
         self.last_mtf_update = {}
         
+        # Indicadores por timeframe: tf_name -> ((hora, cierre) última vela, df)
+        self._indicator_cache = {}
+        
+        # 🔧 Los timeframes se predicen en paralelo (la espera a MT5 domina).
+        # _mtf_lock protege las caches y _predict_lock los buffers de
+        # features/escalado y el modelo activo
+        self._mtf_pool = ThreadPoolExecutor(max_workers=len(self.mtf_timeframes))
+        self._mtf_lock = threading.Lock()
+        self._predict_lock = threading.Lock()
+        
         for tf_name in self.mtf_timeframes:
             self.mtf_cache[tf_name] = None
             self.last_mtf_update[tf_name] = None
@@ -113,10 +344,39 @@ class MLEnsemble:
             "rotate_every_n_ops": ROTATE_MODELS_EVERY_N_OPS,
             "global_operations_count": 0,
             "last_rotation_time": None,
-            "rotation_history": []
+            "rotation_history": deque(maxlen=ROTATION_HISTORY_SIZE)
         }
         
+        # 🔧 Persistencia diferida: el contador/rendimiento se acumula en
+        # memoria y se escribe cada FLUSH_EVERY operaciones o al salir
+        self._dirty = False
+        self._ops_since_flush = 0
+        
+        # 🔧 Estimadores a re-serializar (solo cambian al entrenar)
+        self._model_dirty = {name: False for name in self.model_names}
+        
+        # 🔧 Modelos guardados en disco pero aún no cargados en memoria
+        self._unloaded = set()
+        
+        # 🔧 Referencia directa al estimador activo (se fija al rotar)
+        self._active_model_ref = None
+        
+        # 🔧 Parámetros del scaler y buffer para escalar una sola fila
+        self._scaler_mean = None
+        self._scaler_scale = None
+        self._scaler_columns = None
+        self._scaled_row = None
+        self._feature_row = np.empty(len(FEATURE_COLUMNS), dtype=np.float64)
+        
         self.load_models()
+        
+        # Al salir: guarda los cambios pendientes y apaga el pool MTF
+        atexit.register(self.close)
+    
+    def close(self):
+        """Persiste los cambios pendientes y apaga el pool MTF (llamado al salir)"""
+        self.flush()
+        self._mtf_pool.shutdown(wait=False)
     
     def send_log(self, message):
         """Envía mensaje al log"""
@@ -136,25 +396,41 @@ class MLEnsemble:
         except:
             return None
     
-    def calculate_indicators_for_tf(self, df):
-        """Calcula indicadores para un timeframe"""
-        import ta
+    def calculate_indicators_for_tf(self, df, tf_name=None):
+        """
+        Calcula indicadores para un timeframe
         
-        df['ema_21'] = ta.trend.ema_indicator(df['close'], window=21)
-        df['ema_50'] = ta.trend.ema_indicator(df['close'], window=50)
-        df['atr'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-        df['adx'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
-        df['rsi'] = ta.momentum.rsi(df['close'], window=14)
+        🔧 Mismos valores que ta, calculados con ewm/rolling de pandas. Con
+        tf_name se reutiliza el resultado mientras la última vela (en
+        formación) no cambie en ninguno de sus campos.
+        """
+        if tf_name is not None:
+            # high/low/tick_volume cambian aunque el cierre vuelva al mismo precio
+            cache_key = tuple(
+                df[column].iat[-1]
+                for column in ('time', 'open', 'high', 'low', 'close', 'tick_volume')
+            )
+            cached = self._indicator_cache.get(tf_name)
+            if cached is not None and cached[0] == cache_key:
+                return cached[1]
+        
+        close = df['close']
+        
+        df['ema_21'] = ema(close, 21)
+        df['ema_50'] = ema(close, 50)
+        df['atr'] = average_true_range(df['high'], df['low'], close, window=14)
+        df['adx'] = average_directional_index(df['high'], df['low'], close, window=14)
+        df['rsi'] = relative_strength_index(close, window=14)
         
-        bollinger = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
-        df['bb_high'] = bollinger.bollinger_hband()
-        df['bb_low'] = bollinger.bollinger_lband()
-        df['bb_mid'] = bollinger.bollinger_mavg()
+        bb_mid = close.rolling(20, min_periods=20).mean()
+        bb_std = close.rolling(20, min_periods=20).std(ddof=0)
+        df['bb_high'] = bb_mid + 2 * bb_std
+        df['bb_low'] = bb_mid - 2 * bb_std
+        df['bb_mid'] = bb_mid
         
-        macd = ta.trend.MACD(df['close'])
-        df['macd'] = macd.macd()
-        df['macd_signal'] = macd.macd_signal()
-        df['momentum'] = df['close'].pct_change(periods=10)
+        df['macd'] = ema(close, 12) - ema(close, 26)
+        df['macd_signal'] = ema(df['macd'], 9)
+        df['momentum'] = close.pct_change(periods=10)
         
         df['price_to_ema21'] = (df['close'] - df['ema_21']) / df['ema_21']
         df['price_to_ema50'] = (df['close'] - df['ema_50']) / df['ema_50']
@@ -163,6 +439,10 @@ class MLEnsemble:
         df['volume_change'] = df['tick_volume'].pct_change()
         
         df.dropna(inplace=True)
+        
+        if tf_name is not None:
+            self._indicator_cache[tf_name] = (cache_key, df)
+        
         return df
     
     def prepare_features_from_df(self, df):
@@ -201,12 +481,13 @@ class MLEnsemble:
         cache_key = tf_name
         
         # Verificar cache
-        if cache_key in self.mtf_cache:
-            last_update = self.last_mtf_update.get(cache_key)
-            cache_time = self.mtf_timeframes[tf_name]['cache_seconds']
-            
-            if last_update and (now - last_update).total_seconds() < cache_time:
-                return self.mtf_cache[cache_key]
+        with self._mtf_lock:
+            if cache_key in self.mtf_cache:
+                last_update = self.last_mtf_update.get(cache_key)
+                cache_time = self.mtf_timeframes[tf_name]['cache_seconds']
+                
+                if last_update and (now - last_update).total_seconds() < cache_time:
+                    return self.mtf_cache[cache_key]
         
         # Obtener datos del timeframe
         tf_config = self.mtf_timeframes[tf_name]
@@ -216,26 +497,22 @@ class MLEnsemble:
             return None
         
         # Calcular indicadores
-        df = self.calculate_indicators_for_tf(df)
+        df = self.calculate_indicators_for_tf(df, tf_name)
         
         if len(df) == 0:
             return None
         
-        # Preparar features
-        features = self.prepare_features_from_df(df)
-        
-        if features is None:
-            return None
-        
         # Predecir con modelo activo
         try:
-            X = pd.DataFrame([features])
-            X_scaled = self.scaler.transform(X)
-            
-            model = self.models[self.active_model]["model"]
-            signal = model.predict(X_scaled)[0]
-            probabilities = model.predict_proba(X_scaled)[0]
-            confidence = float(max(probabilities))
+            # 🔧 Features de la última vela directo al buffer, sin dict ni
+            # DataFrame intermedio
+            last_row = df.iloc[-1]
+            with self._predict_lock:
+                row = self._feature_row
+                for i, name in enumerate(FEATURE_COLUMNS):
+                    row[i] = last_row[name]
+                signal, probabilities = self._predict_scaled(self._scale_features(row))
+            confidence = float(probabilities.max())
             
             result = {
                 'signal': int(signal),
@@ -245,8 +522,9 @@ class MLEnsemble:
             }
             
             # Actualizar cache
-            self.mtf_cache[cache_key] = result
-            self.last_mtf_update[cache_key] = now
+            with self._mtf_lock:
+                self.mtf_cache[cache_key] = result
+                self.last_mtf_update[cache_key] = now
             
             return result
             
@@ -262,9 +540,13 @@ class MLEnsemble:
         """
         predictions = []
         
-        # Predecir en cada timeframe
-        for tf_name in ['M30', 'H1', 'H4']:
-            prediction = self.predict_on_timeframe(tf_name, symbol)
+        # Predecir en cada timeframe (en paralelo, resultados en orden)
+        futures = [
+            self._mtf_pool.submit(self.predict_on_timeframe, tf_name, symbol)
+            for tf_name in ['M30', 'H1', 'H4']
+        ]
+        for future in futures:
+            prediction = future.result()
             
             if prediction:
                 predictions.append(prediction)
@@ -323,51 +605,190 @@ class MLEnsemble:
         return final_signal, final_confidence, mtf_details
     
     def save_models(self):
+        """Guarda modelos, metadata y estado de rotación"""
+        if not (self.save_pickles() and self.save_metadata() and self.save_rotation_state()):
+            return False
+        
+        self._dirty = False
+        self._ops_since_flush = 0
+        return True
+    
+    def save_pickles(self):
+        """
+        Guarda los estimadores re-entrenados y el scaler
+        
+        Solo re-serializa los modelos marcados en _model_dirty; el
+        rendimiento y el peso van en models_metadata.json.
+        """
+        dirty = [name for name, flag in self._model_dirty.items() if flag]
+        if not dirty:
+            return True
+        
         try:
-            for name, model_data in self.models.items():
-                model_path = os.path.join(self.models_dir, f"{name}.pkl")
-                with open(model_path, 'wb') as f:
-                    pickle.dump(model_data, f)
+            for name in dirty:
+                model_path = self._model_path(name)
+                model = self.models[name]["model"]
+                atomic_write(model_path, lambda tmp: dump(
+                    model, tmp, compress=MODEL_COMPRESSION, protocol=pickle.HIGHEST_PROTOCOL
+                ))
+                self._model_dirty[name] = False
             
             scaler_path = os.path.join(self.models_dir, "scaler.pkl")
-            with open(scaler_path, 'wb') as f:
-                pickle.dump(self.scaler, f)
+            atomic_write(scaler_path, lambda tmp: dump(
+                self.scaler, tmp, protocol=pickle.HIGHEST_PROTOCOL
+            ))
             
-            rotation_path = os.path.join(self.models_dir, "rotation_config.json")
-            rotation_data = {
-                "rotation_config": self.rotation_config,
-                "current_model_index": self.current_model_index,
-                "active_model": self.active_model
+            return True
+        except Exception as e:
+            print(f"Error guardando modelos: {e}")
+            return False
+    
+    def save_metadata(self):
+        """Guarda rendimiento y peso de cada modelo (JSON, barato)"""
+        try:
+            metadata_path = os.path.join(self.models_dir, "models_metadata.json")
+            metadata = {
+                name: {
+                    "performance": model_data["performance"],
+                    "weight": model_data.get("weight", 1.0)
+                }
+                for name, model_data in self.models.items()
             }
-            with open(rotation_path, 'w') as f:
-                json.dump(rotation_data, f, indent=2)
+            atomic_write(metadata_path, lambda tmp: dump_json(metadata, tmp))
             
             return True
         except Exception as e:
-            print(f"Error guardando modelos: {e}")
+            print(f"Error guardando metadata de modelos: {e}")
+            return False
+    
+    def save_rotation_state(self):
+        """Guarda solo el estado de rotación (JSON, barato)"""
+        try:
+            rotation_path = os.path.join(self.models_dir, "rotation_config.json")
+            rotation_data = self._rotation_state()
+            atomic_write(rotation_path, lambda tmp: dump_json(rotation_data, tmp))
+            
+            return True
+        except Exception as e:
+            print(f"Error guardando estado de rotación: {e}")
             return False
     
+    def _rotation_state(self):
+        """Estado de rotación serializable (historial como lista)"""
+        return {
+            "rotation_config": {
+                **self.rotation_config,
+                "rotation_history": list(self.rotation_config["rotation_history"])
+            },
+            "current_model_index": self.current_model_index,
+            "active_model": self.active_model
+        }
+    
+    def export_config(self):
+        """Estado de rotación y metadata de modelos en JSON legible (depuración)"""
+        return json.dumps({
+            **self._rotation_state(),
+            "models": self.get_models_comparison()
+        }, indent=2)
+    
+    def flush(self):
+        """Persiste los cambios pendientes (llamado también al salir)"""
+        if self._dirty:
+            self.save_models()
+    
+    def _mark_dirty(self):
+        """Marca cambios pendientes y guarda cada FLUSH_EVERY operaciones"""
+        self._dirty = True
+        self._ops_since_flush += 1
+        
+        if self._ops_since_flush >= self.FLUSH_EVERY:
+            self.save_models()
+    
+    def _model_path(self, name):
+        return os.path.join(self.models_dir, f"{name}_model.pkl")
+    
+    def _lazy_load(self, name, evict=True):
+        """
+        Devuelve el estimador, cargándolo de disco si hace falta
+        
+        Con evict=True mantiene un solo modelo en memoria: descarga los
+        demás que ya están guardados y sin cambios pendientes.
+        """
+        if name in self._unloaded:
+            self.models[name]["model"] = load(self._model_path(name))
+            self._unloaded.discard(name)
+            
+            if evict:
+                for other in self.model_names:
+                    if (other != name and other not in self._unloaded
+                            and not self._model_dirty[other]
+                            and os.path.exists(self._model_path(other))):
+                        self.models[other]["model"] = None
+                        self._unloaded.add(other)
+        
+        return self.models[name]["model"]
+    
+    def _get_active_model(self):
+        """Estimador activo, cargado la primera vez que se pide"""
+        model = self._active_model_ref
+        if model is None:
+            model = self._active_model_ref = self._lazy_load(self.active_model)
+        return model
+    
+    def _refresh_scaler_buffers(self):
+        """Copia mean_/scale_ del scaler tras entrenarlo o cargarlo"""
+        if not hasattr(self.scaler, "mean_"):
+            self._scaler_mean = None
+            return
+        
+        self._scaler_mean = np.ascontiguousarray(self.scaler.mean_, dtype=np.float64)
+        self._scaler_scale = np.ascontiguousarray(self.scaler.scale_, dtype=np.float64)
+        names = getattr(self.scaler, "feature_names_in_", None)
+        self._scaler_columns = list(names) if names is not None else None
+        self._scaled_row = np.empty((1, len(self._scaler_mean)), dtype=np.float64)
+    
     def load_models(self):
+        self._active_model_ref = None
         try:
             for name in self.models.keys():
-                model_path = os.path.join(self.models_dir, f"{name}.pkl")
+                model_path = self._model_path(name)
+                legacy_path = os.path.join(self.models_dir, f"{name}.pkl")
                 if os.path.exists(model_path):
-                    with open(model_path, 'rb') as f:
-                        loaded_data = pickle.load(f)
-                        if 'weight' not in loaded_data:
-                            loaded_data['weight'] = 1.0
-                        self.models[name] = loaded_data
+                    # Carga diferida: se lee al usarlo por primera vez
+                    self.models[name]["model"] = None
+                    self._unloaded.add(name)
+                elif os.path.exists(legacy_path):
+                    # Formato anterior: dict completo en {name}.pkl
+                    loaded_data = load(legacy_path)
+                    if 'weight' not in loaded_data:
+                        loaded_data['weight'] = 1.0
+                    self.models[name] = loaded_data
+                    self._model_dirty[name] = True
+                    self._unloaded.discard(name)
+            
+            metadata_path = os.path.join(self.models_dir, "models_metadata.json")
+            if os.path.exists(metadata_path):
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+                for name, meta in metadata.items():
+                    if name in self.models:
+                        self.models[name]["performance"] = meta.get("performance", self.models[name]["performance"])
+                        self.models[name]["weight"] = meta.get("weight", 1.0)
             
             scaler_path = os.path.join(self.models_dir, "scaler.pkl")
             if os.path.exists(scaler_path):
-                with open(scaler_path, 'rb') as f:
-                    self.scaler = pickle.load(f)
+                self.scaler = load(scaler_path)
+            self._refresh_scaler_buffers()
             
             rotation_path = os.path.join(self.models_dir, "rotation_config.json")
             if os.path.exists(rotation_path):
                 with open(rotation_path, 'r') as f:
                     rotation_data = json.load(f)
                     self.rotation_config = rotation_data.get("rotation_config", self.rotation_config)
+                    self.rotation_config["rotation_history"] = deque(
+                        self.rotation_config.get("rotation_history", []),
+                        maxlen=ROTATION_HISTORY_SIZE
+                    )
                     self.current_model_index = rotation_data.get("current_model_index", 0)
                     self.active_model = rotation_data.get("active_model", self.model_names[0])
             
@@ -376,35 +797,115 @@ class MLEnsemble:
             print(f"Error cargando modelos: {e}")
             return False
     
-    def train_all_models(self, X_train, y_train, X_test, y_test):
+    def train_all_models(self, X_train, y_train, X_test, y_test, force_refit=False):
+        from sklearn.base import clone
+        
         results = {}
         
-        X_train_scaled = self.scaler.fit_transform(X_train)
+        # force_refit: re-ajusta el scaler aunque la deriva sea menor a la tolerancia
+        if force_refit or self._scaler_drifted(X_train):
+            X_train_scaled = self.scaler.fit_transform(X_train)
+            self._refresh_scaler_buffers()
+        else:
+            X_train_scaled = self.scaler.transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
         
-        for name, model_data in self.models.items():
+        # 🔧 Los tres modelos se entrenan en paralelo; el RF reparte los
+        # núcleos restantes para no sobresuscribir la CPU
+        cores = os.cpu_count() or 1
+        n_jobs = min(len(self.models), cores)
+        
+        models = {}
+        restore_n_jobs = {}
+        for name in self.models:
+            model = clone(self._templates[name])
+            
+            if n_jobs > 1 and "n_jobs" in model.get_params():
+                restore_n_jobs[name] = model.n_jobs
+                model.set_params(n_jobs=max(1, cores // n_jobs))
+            
+            models[name] = model
+        
+        fitted = Parallel(n_jobs=n_jobs, backend='loky')(
+            delayed(fit_one_model)(name, model, X_train_scaled, y_train, X_test_scaled, y_test)
+            for name, model in models.items()
+        )
+        
+        for name, model, metrics in fitted:
+            if model is not None and name in restore_n_jobs:
+                model.set_params(n_jobs=restore_n_jobs[name])
+            
+            if model is None:
+                print(f"Error entrenando {name}: {metrics['error']}")
+            else:
+                self.models[name]["model"] = model
+                self._model_dirty[name] = True
+            
+            results[name] = metrics
+        
+        # Los workers devuelven copias: re-resolver el modelo activo
+        self._active_model_ref = None
+        
+        self.save_models()
+        return results
+    
+    def _scaler_drifted(self, X_train):
+        """
+        Indica si hay que re-ajustar el scaler: no está ajustado, cambió el
+        formato de entrada (DataFrame/array) o alguna media se movió 5% o
+        más de su desviación
+        """
+        if not hasattr(self.scaler, "mean_"):
+            return True
+        if hasattr(X_train, "columns") != hasattr(self.scaler, "feature_names_in_"):
+            return True
+        
+        new_mean = np.asarray(X_train, dtype=np.float64).mean(axis=0)
+        if new_mean.shape != self.scaler.mean_.shape:
+            return True
+        
+        return np.max(np.abs(new_mean - self.scaler.mean_) / self.scaler.scale_) >= SCALER_DRIFT_TOLERANCE
+    
+    def incremental_update(self, X_train, y_train, X_test, y_test):
+        """
+        🆕 Actualiza los modelos sin re-entrenarlos desde cero
+        
+        RF y HistGB añaden árboles con warm_start sobre el lote nuevo y la red
+        neuronal hace partial_fit. El scaler no se re-ajusta.
+        
+        Returns:
+            dict con métricas por modelo, o None si algún modelo no está
+            entrenado o el lote no trae las mismas clases (requiere
+            train_all_models)
+        """
+        models = {name: self._lazy_load(name, evict=False) for name in self.model_names}
+        batch_classes = set(np.unique(y_train))
+        for name, model in models.items():
+            if type(model) is not type(self._templates[name]):
+                return None
+            if not hasattr(model, "classes_") or set(model.classes_) != batch_classes:
+                return None
+        
+        results = {}
+        
+        X_train_scaled = self.scaler.transform(X_train)
+        X_test_scaled = self.scaler.transform(X_test)
+        
+        for name, model in models.items():
             try:
-                model = model_data["model"]
-                model.fit(X_train_scaled, y_train)
-                
-                y_pred_test = model.predict(X_test_scaled)
-                
-                test_acc = accuracy_score(y_test, y_pred_test)
-                precision = precision_score(y_test, y_pred_test, average='weighted', zero_division=0)
-                recall = recall_score(y_test, y_pred_test, average='weighted', zero_division=0)
-                f1 = f1_score(y_test, y_pred_test, average='weighted', zero_division=0)
-                
-                results[name] = {
-                    "test_accuracy": test_acc,
-                    "precision": precision,
-                    "recall": recall,
-                    "f1_score": f1
-                }
+                if name in self.WARM_START_TREES:
+                    param, extra = self.WARM_START_TREES[name]
+                    model.set_params(warm_start=True, **{param: getattr(model, param) + extra})
+                    model.fit(X_train_scaled, y_train)
+                    model.set_params(warm_start=False)
+                else:
+                    model.partial_fit(X_train_scaled, y_train)
                 
-                self.models[name]["model"] = model
+                results[name] = evaluate_model(model, X_test_scaled, y_test)
+                self._model_dirty[name] = True
                 
             except Exception as e:
-                print(f"Error entrenando {name}: {e}")
+                print(f"Error actualizando {name}: {e}")
                 results[name] = {"error": str(e)}
         
         self.save_models()
@@ -412,41 +913,113 @@ class MLEnsemble:
     
     def predict_with_active_model(self, X):
         """Predicción legacy (sin MTF) para compatibilidad"""
-        X_scaled = self.scaler.transform(X)
-        model = self.models[self.active_model]["model"]
+        return self._predict_scaled(self._scale_single(X))
+    
+    def predict_from_row(self, row):
+        """
+        🆕 Predicción sin DataFrame a partir de un array 1D de features
+        
+        El escalado se escribe en un buffer reutilizado entre llamadas, así
+        que no es reentrante: no llamar desde varios hilos a la vez.
         
-        signal = model.predict(X_scaled)[0]
+        Args:
+            row: Array 1D en el orden de FEATURE_COLUMNS
+        
+        Returns:
+            tuple: (signal, probabilities)
+        """
+        return self._predict_scaled(self._scale_features(row))
+    
+    def _scale_features(self, row):
+        """Escala un array 1D de features en el buffer _scaled_row"""
+        if self._scaler_mean is None:
+            return self.scaler.transform(np.asarray(row, dtype=np.float64).reshape(1, -1))
+        
+        scale_row(row, self._scaler_mean, self._scaler_scale, self._scaled_row[0])
+        return self._scaled_row
+    
+    def _predict_scaled(self, X_scaled):
+        if self.use_ensemble_voting:
+            return self._vote(X_scaled)
+        
+        model = self._get_active_model()
+        
+        # predict() repetiría el recorrido de los árboles: la clase sale
+        # del argmax de las probabilidades
         probabilities = model.predict_proba(X_scaled)[0]
+        signal = model.classes_[probabilities.argmax()]
+        
+        return int(signal), probabilities
+    
+    def predict_with_voting(self, X):
+        """
+        🆕 Votación suave: promedia predict_proba de los modelos entrenados
+        ponderando por su peso
+        
+        La rotación sigue decidiendo a qué modelo se le imputa cada trade.
+        
+        Returns:
+            tuple: (signal, probabilities)
+        """
+        return self._vote(self._scale_single(X))
+    
+    def _vote(self, X_scaled):
+        votes = []
+        weights = []
+        classes = None
+        for name in self.model_names:
+            model = self._lazy_load(name, evict=False)
+            if not hasattr(model, "classes_"):
+                continue
+            
+            votes.append(model.predict_proba(X_scaled)[0])
+            weights.append(self.models[name].get("weight", 1.0))
+            classes = model.classes_
+        
+        if not votes:
+            raise ValueError("Ningún modelo entrenado para votar")
+        
+        weights = np.asarray(weights)
+        probabilities = (np.stack(votes) * weights[:, None]).sum(axis=0) / weights.sum()
+        signal = classes[probabilities.argmax()]
         
         return int(signal), probabilities
     
+    def _scale_single(self, X):
+        """Escala una fila con los buffers cacheados del scaler"""
+        if self._scaler_mean is None or len(X) != 1:
+            return self.scaler.transform(X)
+        
+        if self._scaler_columns is not None and hasattr(X, "columns"):
+            if list(X.columns) != self._scaler_columns:
+                X = X[self._scaler_columns]
+        
+        row = np.asarray(X, dtype=np.float64)[0]
+        scale_row(row, self._scaler_mean, self._scaler_scale, self._scaled_row[0])
+        return self._scaled_row
+    
     def update_model_performance(self, model_name, correct, profit):
         if model_name in self.models:
             perf = self.models[model_name]["performance"]
             perf["trades"] += 1
             
-            if perf["trades"] > 0:
-                if correct:
-                    perf["accuracy"] = ((perf["accuracy"] * (perf["trades"] - 1)) + 100) / perf["trades"]
-                else:
-                    perf["accuracy"] = (perf["accuracy"] * (perf["trades"] - 1)) / perf["trades"]
+            # Media incremental de aciertos (0 ó 100 por trade)
+            perf["accuracy"] += (100 * bool(correct) - perf["accuracy"]) / perf["trades"]
             
             perf["profit"] += profit
             
             if perf["trades"] >= 5:
-                if perf["accuracy"] > 60:
-                    self.models[model_name]["weight"] = 1.5
-                elif perf["accuracy"] > 50:
-                    self.models[model_name]["weight"] = 1.0
-                else:
-                    self.models[model_name]["weight"] = 0.5
+                for threshold, weight in self._weight_thresholds:
+                    if perf["accuracy"] > threshold:
+                        self.models[model_name]["weight"] = weight
+                        break
             
-            self.save_models()
+            self._mark_dirty()
     
     def increment_global_counter(self):
         """Incrementa el contador MANUALMENTE"""
         self.rotation_config["global_operations_count"] += 1
-        self.save_models()
+        self._mark_dirty()
     
     def should_rotate_cyclic(self):
         """Verifica si debe rotar según contador global"""
@@ -468,15 +1041,17 @@ class MLEnsemble:
         
         self.current_model_index = (self.current_model_index + 1) % len(self.model_names)
         self.active_model = self.model_names[self.current_model_index]
+        self._active_model_ref = self._lazy_load(self.active_model)
         
         new_accuracy = self.models[self.active_model]["performance"]["accuracy"]
         new_trades = self.models[self.active_model]["performance"]["trades"]
         
+        now_iso = datetime.now().isoformat()
         self.rotation_config["global_operations_count"] = 0
-        self.rotation_config["last_rotation_time"] = datetime.now().isoformat()
+        self.rotation_config["last_rotation_time"] = now_iso
         
         rotation_event = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso,
             "from_model": old_model,
             "to_model": self.active_model,
             "old_accuracy": old_accuracy,
@@ -490,10 +1065,7 @@ class MLEnsemble:
         
         self.rotation_config["rotation_history"].append(rotation_event)
         
-        if len(self.rotation_config["rotation_history"]) > 20:
-            self.rotation_config["rotation_history"] = self.rotation_config["rotation_history"][-20:]
-        
-        self.save_models()
+        self.save_rotation_state()
         
         return rotation_event
     
@@ -509,7 +1081,7 @@ class MLEnsemble:
     
     def get_rotation_history(self, limit=10):
         """Retorna historial de rotaciones"""
-        history = self.rotation_config.get("rotation_history", [])
+        history = list(self.rotation_config.get("rotation_history", []))
         return history[-limit:] if len(history) > limit else history
     
     def get_rotation_status(self):
@@ -527,6 +1099,10 @@ class MLEnsemble:
 class IncrementalLearningSystem:
     """Sistema de aprendizaje incremental"""
     
+    # Cada cuántos re-entrenamientos se hace uno completo (re-ajusta el
+    # scaler y poda los árboles acumulados por warm_start)
+    FULL_RETRAIN_EVERY = 10
+    
     def __init__(self, memory, ensemble, retrain_every=RETRAIN_EVERY_N_OPS, logger=None):
         self.memory = memory
         self.ensemble = ensemble
@@ -535,6 +1111,9 @@ class IncrementalLearningSystem:
         
         self.operations_since_last_train = 0
         
+        # Huella de los trades usados en el último re-entrenamiento
+        self._last_fingerprint = None
+        
         self.learning_stats = {
             "total_retrains": 0,
             "last_retrain": None,
@@ -577,26 +1156,50 @@ class IncrementalLearningSystem:
                 self.send_log(f"⚠️ Solo {len(all_trades)} trades rentables disponibles (mín: 20)")
                 return None
             
+            # 🔧 Los modelos se entrenan con current_market_df: sin velas nuevas
+            # (ni trades nuevos) el re-entrenamiento daría el mismo resultado
+            last_bar = (
+                current_market_df["time"].iat[-1] if "time" in current_market_df.columns
+                else current_market_df.index[-1]
+            )
+            fingerprint = hashlib.sha1(
+                f"{last_bar}|{len(current_market_df)}|".encode() +
+                b",".join(str(t.get("id")).encode() for t in all_trades)
+            ).digest()
+            if fingerprint == self._last_fingerprint:
+                self.send_log("⏭️ Sin velas ni trades rentables nuevos desde el último re-entrenamiento")
+                return None
+            
             self.send_log(f"📚 Entrenando con {len(all_trades)} operaciones RENTABLES (profit >= ${MIN_PROFIT_FOR_LEARNING})")
             
-            for trade in all_trades:
-                strategy = trade.get("strategy", "unknown")
-                if strategy in self.learning_stats["operations_per_strategy"]:
-                    self.learning_stats["operations_per_strategy"][strategy] += 1
+            counts = pd.Series([t.get("strategy", "unknown") for t in all_trades]).value_counts()
+            ops_per_strategy = self.learning_stats["operations_per_strategy"]
+            for strategy in ops_per_strategy:
+                ops_per_strategy[strategy] += int(counts.get(strategy, 0))
             
-            feature_columns = ['ema_21', 'ema_50', 'atr', 'adx', 'rsi', 'macd',
-                             'macd_signal', 'momentum', 'price_to_ema21',
-                             'price_to_ema50', 'ema_diff', 'bb_position', 'volume_change']
+            from sklearn.model_selection import train_test_split
             
-            X = current_market_df[feature_columns]
-            y = current_market_df['target']
+            # Arrays contiguos: sklearn no revalida columna a columna
+            X = current_market_df.loc[:, list(FEATURE_COLUMNS)].to_numpy(dtype=np.float32, copy=False)
+            y = current_market_df[TARGET_COLUMN].to_numpy(dtype=np.int8, copy=False)
             
             X_train, X_test, y_train, y_test = train_test_split(
                 X, y, test_size=0.2, random_state=42
             )
             
-            results = self.ensemble.train_all_models(X_train, y_train, X_test, y_test)
+            results = None
+            full_retrain = self.learning_stats["incremental_trains"] % self.FULL_RETRAIN_EVERY == 0
+            if not full_retrain:
+                results = self.ensemble.incremental_update(X_train, y_train, X_test, y_test)
+            
+            if results is None:
+                # El completo periódico re-ajusta el scaler: la deriva por
+                # debajo de SCALER_DRIFT_TOLERANCE no se acumula sin límite
+                results = self.ensemble.train_all_models(
+                    X_train, y_train, X_test, y_test, force_refit=full_retrain
+                )
             
+            self._last_fingerprint = fingerprint
             self.learning_stats["incremental_trains"] += 1
             self.learning_stats["last_incremental_train"] = datetime.now().isoformat()
             